@@ -0,0 +1,44 @@
+import argparse
+import importlib
+import logging
+from pathlib import Path
+
+import synthetic
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Read by every stage when ATLAS_SYNTHETIC_DATA=1 (see config.py)
+ROOT_FOLDER = Config.SYNTHETIC_DATA_PATH / '01_root'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic MiniNtuple ROOT files as a stand-in for the real samples')
+    parser.add_argument('--events', type=int, default=3_800_000,
+                        help='Total number of events, shared between the samples like the real MiniNtuples')
+    parser.add_argument('--processes', nargs='+', choices=list(synthetic.SAMPLES), default=list(synthetic.SAMPLES))
+    parser.add_argument('--output', default=ROOT_FOLDER)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--empty-fraction', type=float, default=0.02,
+                        help='Share of events with empty object-level branches, as in the real MiniNtuples')
+    parser.add_argument('--seed', type=int, default=Config.GLOBAL_SEED_NUMBER)
+    parser.add_argument('--json', action='store_true', help='Also convert the files with 01_root2json')
+    arguments = parser.parse_args()
+
+    root_folder = Path(arguments.output)
+    root_folder.mkdir(parents=True, exist_ok=True)
+
+    sizes = synthetic.process_sizes(arguments.events)
+    for process in arguments.processes:
+        file_stem, tree_name = synthetic.SAMPLES[process]
+        where_root = str(root_folder / f'{file_stem}.root')
+        logging.info(f'Writing {sizes[process]} {process} events to {where_root} ({tree_name})')
+        synthetic.write_sample(where_root, process, sizes[process], arguments.seed, arguments.chunk_size,
+                               arguments.empty_fraction)
+
+        if arguments.json:
+            importlib.import_module('01_root2json').root2json(where_root)
+
+
+if __name__ == '__main__':
+    main()
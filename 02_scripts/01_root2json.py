@@ -2,14 +2,17 @@ from config import *
 import uproot
 import logging
 import json
+from pathlib import Path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-ROOT_PATH = '../01_src/01_data/01_root/MiniNtuple_tzbq_SM_100K.root'
-
 def main():
-    root2json(ROOT_PATH)
+    for where_root in Config.ROOT_PATHS.values():
+        if where_root.exists():
+            root2json(str(where_root))
+        else:
+            logging.warning(f"ROOT file not found: {where_root}")
 
 
 def root2json(where_root: str) -> None:
@@ -39,8 +42,10 @@ def root2json(where_root: str) -> None:
                         extracted_data[branch_name] = branch_data
 
                 # Writing data to a JSON file
-                json_path_parts = where_root.replace('01_root', '02_json').replace('root', 'json').rsplit('.', 1)
-                where_json = f'{json_path_parts[0]}_({tree_name}).{json_path_parts[1]}'
+                root_path = Path(where_root)
+                json_folder = root_path.parent.with_name(root_path.parent.name.replace('01_root', '02_json'))
+                where_json = json_folder / f'{root_path.stem}_({tree_name}).json'
+                json_folder.mkdir(parents=True, exist_ok=True)
 
                 with open(where_json, 'w', encoding='utf-8') as json_file:
                     json.dump(extracted_data, json_file, ensure_ascii=False)
@@ -23,11 +23,11 @@ def set_plot_style():
     })
 
 def main():
-    tHbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tHbq_SM_300K_(aTTreethbqSM;1).json')
-    tt_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tt_SM_3M_(aTTreett;1).json')
-    ttbb_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttbb_SM_300K_(aTTreett;1).json')
-    ttH_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttH_SM_100K_(aTTreetth;1).json')
-    tzbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tzbq_SM_100K_(aTTreethbq;1).json')
+    tHbq_events = pd.read_json(Config.JSON_PATHS['tHbq'])
+    tt_events = pd.read_json(Config.JSON_PATHS['tt'])
+    ttbb_events = pd.read_json(Config.JSON_PATHS['ttbb'])
+    ttH_events = pd.read_json(Config.JSON_PATHS['ttH'])
+    tzbq_events = pd.read_json(Config.JSON_PATHS['tZbq'])
 
     signal_data_frame = tHbq_events
     signal_data_frame.index = range(1, len(signal_data_frame) + 1)
@@ -35,7 +35,7 @@ def main():
     background_data_frame = pd.concat([tt_events, ttbb_events, ttH_events, tzbq_events])
     background_data_frame.index = range(1, len(background_data_frame) + 1)
 
-    folder = Path("../03_results/01_variables_distributions")
+    folder = Path(Config.DISTRIBUTIONS_SAVE_PATH)
     if not folder.exists():
         folder.mkdir()
 
@@ -64,10 +64,11 @@ def normalize(data, max_value=None, min_value=None):
 def histogram(signal, background, signal_normalized, background_transformed):
     name = signal.columns[0]
 
-    signal = signal.squeeze()
-    background = background.squeeze()
-    signal_normalized = signal_normalized.squeeze()
-    background_transformed = background_transformed.squeeze()
+    # Events with an empty branch have no value to histogram
+    signal = signal.squeeze().dropna()
+    background = background.squeeze().dropna()
+    signal_normalized = signal_normalized.squeeze().dropna()
+    background_transformed = background_transformed.squeeze().dropna()
 
     mean_value_signal = signal.mean()
     standard_deviation_signal = signal.std()
@@ -117,7 +118,7 @@ def histogram(signal, background, signal_normalized, background_transformed):
     figure.text(0.5, abscissa_label_y_position, f'{Config.VARIABLES_DESCRIPTION[name]} ({name})', ha='center',
                 fontsize=FONT_SIZE)
 
-    plt.savefig(f'../03_results/01_variables_distributions/{name}.png', dpi=300)
+    plt.savefig(f'{Config.DISTRIBUTIONS_SAVE_PATH}/{name}.png', dpi=300)
     plt.close()
 
 
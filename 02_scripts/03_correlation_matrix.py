@@ -2,18 +2,19 @@ import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
 import seaborn as sns
+from config import Config
 
 TEXT_FONT_SIZE = 7
 DIGIT_FONT_SIZE = 7
 TILE_FONT_SIZE = 14
-SAVE_PATH = '../03_results/correlation_matrix_tzbq.png'
+SAVE_PATH = Config.CORRELATION_MATRIX_SAVE_PATH
 
 def main():
-    tHbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tHbq_SM_300K_(aTTreethbqSM;1).json')
-    tt_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tt_SM_3M_(aTTreett;1).json')
-    ttbb_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttbb_SM_300K_(aTTreett;1).json')
-    ttH_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttH_SM_100K_(aTTreetth;1).json')
-    tzbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tzbq_SM_100K_(aTTreethbq;1).json')
+    tHbq_events = pd.read_json(Config.JSON_PATHS['tHbq'])
+    tt_events = pd.read_json(Config.JSON_PATHS['tt'])
+    ttbb_events = pd.read_json(Config.JSON_PATHS['ttbb'])
+    ttH_events = pd.read_json(Config.JSON_PATHS['ttH'])
+    tzbq_events = pd.read_json(Config.JSON_PATHS['tZbq'])
 
     total_events = pd.concat([tzbq_events])
 
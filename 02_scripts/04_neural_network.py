@@ -1,8 +1,6 @@
 import numpy as np
 #from jax.example_libraries.stax import randn
 from matplotlib.ticker import ScalarFormatter
-from sklearn.metrics import roc_curve, auc
-from sklearn.model_selection import train_test_split
 import pandas as pd
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Dropout, BatchNormalization
@@ -11,16 +9,26 @@ from tensorflow.keras.initializers import HeNormal
 from tensorflow.keras.optimizers import Adam, SGD, RMSprop, Nadam
 import matplotlib
 import matplotlib.pyplot as plt
-import scienceplots
 from config import Config
+import metrics
+import bootstrap
+import performance_plots
 import tensorflow as tf
 import random
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import kfold
+import event_store
+import study_summary
+import instrumentation
+import time
+from batch_sampler import StratifiedBatchSequence
 import optuna
 from optuna.integration import KerasPruningCallback
 
-WEIGHTS_SEED_NUMBER = 35
-GLOBAL_SEED_NUMBER = 5
+WEIGHTS_SEED_NUMBER = Config.WEIGHTS_SEED_NUMBER
+GLOBAL_SEED_NUMBER = Config.GLOBAL_SEED_NUMBER
 FONT_SIZE = 14
 
 MY_FORMATTER = ScalarFormatter(useMathText=True)
@@ -36,122 +44,95 @@ os.environ['TF_NUM_INTRAOP_THREADS'] = '1'
 os.environ['TF_NUM_INTEROP_THREADS'] = '1'
 
 
-WEIGHTS = {
-    "tHbq": 2.0,
-    "tt": 1.0,
-    "ttbb": 1.862340,
-    "ttH": 0.268164,
-    "tZbq": 0.085833
-}
-
-SIGNAL_SIGNIFICANCE_WEIGHTS = {
-    "tHbq": 0.00932265,
-    "tt": 0.0537442,
-    "ttbb": 0.100090,
-    "ttH": 0.0144123,
-    "tZbq": 0.00461306
-}
-
 best_neural_network = None
 best_auc_score = 0.0
 best_neural_network_training_history = None
-
-PLOTS_SAVE_PATH = '../03_results/03_neural_network/01_performance_plots'
+best_out_of_fold_predictions = None
+
+PLOTS_SAVE_PATH = Config.PLOTS_SAVE_PATH
+OPTIMIZATION_METRIC = 'auc'
+# Number of score bins for the sort-free AUC used per trial (None = exact AUC together with all other metrics)
+OBJECTIVE_AUC_BINS = None
+# Number of cross-validation folds, each trained in its own process (1 = single train/test split)
+N_FOLDS = 1
+OUT_OF_FOLD_SAVE_PATH = Config.OUT_OF_FOLD_SAVE_PATH
+# Draw training batches with per-process quotas proportional to the effective weight (see batch_sampler.py)
+STRATIFIED_BATCHES = False
+# Softmax head over all processes (event_store process index) instead of signal vs. background; the signal score
+# is the signal class probability, so the metrics, the objective and the plots are unchanged
+MULTICLASS = False
+LOSS = 'sparse_categorical_crossentropy' if MULTICLASS else 'binary_crossentropy'
+VALIDATION_SPLIT = Config.VALIDATION_SIZE
+# Per-trial phase timings are appended here; set CHROME_TRACE_PATH to also export them for chrome://tracing
+TRACE_PATH = Config.TRACE_PATH
+CHROME_TRACE_PATH = None
 
 class EvaluateWithoutDropout(Callback):
-    def __init__(self, train_data, sample_weight=None):
+    def __init__(self, train_data, sample_weight=None, profiler=None):
         super().__init__()
         self.train_data = train_data
         self.sample_weight = sample_weight
+        self.profiler = profiler
 
     def on_epoch_end(self, epoch, logs=None):
+        start = time.time()
+        counter = time.perf_counter()
         results = self.model.evaluate(
             self.train_data[0],
             self.train_data[1],
             sample_weight=self.sample_weight,
             verbose=0
         )
+        if self.profiler is not None:
+            self.profiler.add('evaluate_without_dropout', start, time.perf_counter() - counter,
+                              n_events=len(self.train_data[1]), epoch=epoch)
 
         for name, value in zip(self.model.metrics_names, results):
             logs[name] = value
 
 
+class EpochProfiler(Callback):
+    # Must come before EvaluateWithoutDropout in the callback list so the epoch span excludes the re-evaluation
+    def __init__(self, profiler, batch_size):
+        super().__init__()
+        self.profiler = profiler
+        self.batch_size = batch_size
+        self.start = None
+        self.counter = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.time()
+        self.counter = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.profiler.add('epoch', self.start, time.perf_counter() - self.counter,
+                          n_events=self.params['steps'] * self.batch_size, epoch=epoch)
+
+
 def set_plot_style():
-    plt.style.use(['science', 'notebook', 'grid'])
-    plt.rcParams.update({
-        'font.size': FONT_SIZE,
-        'pdf.fonttype': 42,
-        'axes.formatter.useoffset': False,
-        'axes.formatter.offset_threshold': 1
-    })
+    performance_plots.set_plot_style()
+
 
+def load_data(json_paths=None):
+    total_events = event_store.load_events(json_paths)
 
-def normalize(data, max_value=None, min_value=None):
-    if not isinstance(data, pd.DataFrame):
-        data = data.to_frame()
-
-    if max_value is None and min_value is None:
-        max_value = data.max()
-        min_value = data.min()
-
-    data = (data - min_value) / (max_value - min_value)
-    return data, max_value, min_value
-
-
-def load_data():
-    tHbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tHbq_SM_300K_(aTTreethbqSM;1).json')
-    tt_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tt_SM_3M_(aTTreett;1).json')
-    ttbb_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttbb_SM_300K_(aTTreett;1).json')
-    ttH_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_ttH_SM_100K_(aTTreetth;1).json')
-    tZbq_events = pd.read_json('../01_src/01_data/02_json/MiniNtuple_tzbq_SM_100K_(aTTreethbq;1).json')
-
-    for branch_name in Config.VARIABLES_DESCRIPTION:
-        tHbq_events[branch_name], max_value, min_value = normalize(tHbq_events[branch_name])
-        tt_events[branch_name], _, _ = normalize(tt_events[branch_name], max_value, min_value)
-        ttbb_events[branch_name], _, _ = normalize(ttbb_events[branch_name], max_value, min_value)
-        ttH_events[branch_name], _, _ = normalize(ttH_events[branch_name], max_value, min_value)
-        tZbq_events[branch_name], _, _ = normalize(tZbq_events[branch_name], max_value, min_value)
-
-    # Label data
-    tHbq_events['signal'] = 1
-    tt_events['signal'] = 0
-    ttbb_events['signal'] = 0
-    ttH_events['signal'] = 0
-    tZbq_events['signal'] = 0
-
-    tHbq_events['weight'] = WEIGHTS['tHbq']
-    tt_events['weight'] = WEIGHTS['tt']
-    ttbb_events['weight'] = WEIGHTS['ttbb']
-    ttH_events['weight'] = WEIGHTS['ttH']
-    tZbq_events['weight'] = WEIGHTS['tZbq']
-
-    tHbq_events['significance_weight'] = SIGNAL_SIGNIFICANCE_WEIGHTS['tHbq']
-    tt_events['significance_weight'] = SIGNAL_SIGNIFICANCE_WEIGHTS['tt']
-    ttbb_events['significance_weight'] = SIGNAL_SIGNIFICANCE_WEIGHTS['ttbb']
-    ttH_events['significance_weight'] = SIGNAL_SIGNIFICANCE_WEIGHTS['ttH']
-    tZbq_events['significance_weight'] = SIGNAL_SIGNIFICANCE_WEIGHTS['tZbq']
-
-    # Prepare data
-    total_events = pd.concat([tHbq_events, tt_events, ttbb_events, ttH_events, tZbq_events])
-    total_events = total_events.sample(frac=1).reset_index(drop=True)
-    total_events.index = range(1, len(total_events) + 1)
-
-    input_data = total_events.drop(columns=['signal', 'weight', 'significance_weight'])
+    input_data = total_events.drop(columns=event_store.LABEL_COLUMNS)
     output_data = pd.Series(total_events['signal'])
     events_weights = pd.Series(total_events['weight'])
     significance_weights = pd.Series(total_events['significance_weight'])
+    processes = pd.Series(total_events['process'])
 
-    return input_data, output_data, events_weights, significance_weights
+    return input_data, output_data, events_weights, significance_weights, processes
 
 
 def save_history(history):
     plt.figure()
 
-    plt.ylabel('Weighted Binary Crossentropy', fontsize=FONT_SIZE)
+    plt.ylabel(f'Weighted {LOSS.replace("_", " ").title()}', fontsize=FONT_SIZE)
     plt.xlabel('Number of Epochs', fontsize=FONT_SIZE)
     plt.tick_params(axis='both', labelsize=FONT_SIZE)
-    plt.plot(history.history['weighted_binary_crossentropy'], label='Train Data')
-    plt.plot(history.history['val_weighted_binary_crossentropy'], label='Validation Data')
+    plt.plot(history.history[f'weighted_{LOSS}'], label='Train Data')
+    plt.plot(history.history[f'val_weighted_{LOSS}'], label='Validation Data')
     plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
 
     plt.savefig(f'{PLOTS_SAVE_PATH}/01_png/training_history.png', dpi=300)
@@ -159,108 +140,20 @@ def save_history(history):
     plt.close()
 
 
-def save_roc_curve(model, inputs_data, outputs, weights):
-    predictions = model.predict(inputs_data).ravel()
-    fpr, tpr, thresholds = roc_curve(outputs, predictions, sample_weight=weights, drop_intermediate=False)
-    auc_score = auc(fpr, tpr)
-
-    plt.figure()
-    plt.title('Receiver Operating Characteristic', fontsize=FONT_SIZE)
-    plt.ylabel('True Positive Rate', fontsize=FONT_SIZE)
-    plt.xlabel('False Positive Rate', fontsize=FONT_SIZE)
-    plt.tick_params(axis='both', labelsize=FONT_SIZE)
-    plt.plot(fpr, tpr, color='blue', label='ROC curve (AUC = %0.4f)' % auc_score)
-    plt.plot([0, 1], [0, 1], color='red', linestyle='--')
-    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
-
-    plt.savefig(f'{PLOTS_SAVE_PATH}/01_png/roc_curve.png', dpi=300)
-    plt.savefig(f'{PLOTS_SAVE_PATH}/02_pdf/roc_curve.pdf')
-    plt.close()
-
-
-def save_histogram_of_predictions(model, inputs_data, outputs, weights=None, significance_weights=None):
-    bins = np.linspace(0, 1, 30)
-
-    predictions = model.predict(inputs_data).ravel()
+def save_performance_plots(model, inputs_data, outputs, weights, significance_weights):
+    # The ROC curve and output histogram of 06, drawn by the same performance_plots functions
+    predictions = event_store.signal_scores(model.predict(inputs_data))
+    outputs = np.asarray(outputs)
+    weights = np.asarray(weights)
+    scores = metrics.evaluate(predictions, outputs, weights, significance_weights)
+    intervals = bootstrap.bootstrap(predictions, outputs, weights, significance_weights,
+                                    n_replicas=performance_plots.BOOTSTRAP_REPLICAS, seed=GLOBAL_SEED_NUMBER)
 
     signal_mask = outputs == 1
-    background_mask = outputs == 0
-
-    signal_predictions = predictions[signal_mask]
-    background_predictions = predictions[background_mask]
-
-    signal_weights = weights[signal_mask]
-    background_weights = weights[background_mask]
-    signal_hist, _ = np.histogram(signal_predictions, bins=bins, weights=signal_weights, density=True)
-    background_hist, _ = np.histogram(background_predictions, bins=bins, weights=background_weights, density=True)
-    signal_hist /= np.sum(signal_hist)
-    background_hist /= np.sum(background_hist)
-
-    separation_power = 0
-    for i in range(1, len(signal_hist) - 1):
-        if signal_hist[i] == 0 and background_hist[i] == 0:
-            continue
-        separation_power += (signal_hist[i] - background_hist[i]) ** 2 / (signal_hist[i] + background_hist[i])
-    separation_power *= 0.5
-
-    plt.figure()
-    plt.title('Histogram of Neural Network Output', fontsize=FONT_SIZE)
-    plt.xlabel('Predicted Probability', fontsize=FONT_SIZE)
-    plt.ylabel('Number of events', fontsize=FONT_SIZE)
-    plt.tick_params(axis='both', labelsize=FONT_SIZE)
-    plt.hist(signal_predictions, bins=bins, alpha=0.9, hatch='//', histtype='step', label='Signal (p + p → t + H)',
-             color='red', weights=signal_weights)
-    plt.hist(background_predictions, bins=bins, alpha=0.4, label='Background', color='blue', weights=background_weights)
-    plt.legend(loc='upper center', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
-
-    signal_weights = significance_weights[signal_mask]
-    background_weights = significance_weights[background_mask]
-    signal_hist, _ = np.histogram(signal_predictions, bins=bins, weights=signal_weights, density=True)
-    background_hist, _ = np.histogram(background_predictions, bins=bins, weights=background_weights, density=True)
-    signal_hist /= np.sum(signal_hist)
-    background_hist /= np.sum(background_hist)
-
-    signal_significance = 0
-    for i in range(1, len(signal_hist) - 1):
-        if signal_hist[i] == 0 and background_hist[i] == 0:
-            continue
-        signal_significance += (signal_hist[i] / np.sqrt(signal_hist[i] + background_hist[i]))
-
-    plt.annotate(f'Separation Power: {separation_power * 100:.2f}%\nSignal Significance: {signal_significance * 100:.2f}%',
-                 xy=(0.28, 0.80), xycoords='axes fraction', fontsize=FONT_SIZE, verticalalignment='top',
-                bbox=dict(boxstyle="square,pad=0.3", fc="white", ec="black", lw=1))
-
-    plt.savefig(f'{PLOTS_SAVE_PATH}/01_png/prediction.png', dpi=300)
-    plt.savefig(f'{PLOTS_SAVE_PATH}/02_pdf/prediction.pdf')
-    plt.close()
-
-
-def save_separate_histogram_of_predictions(model, inputs_data, outputs):
-    predictions = model.predict(inputs_data).ravel()
-
-    variables = list(inputs_data.columns)
-
-    for variable in variables:
-        signal_predictions = inputs_data[outputs == 1][variable]
-
-        high_signal_mask = (predictions > 0.95) & (outputs == 1)
-        high_signal_predictions = inputs_data[high_signal_mask][variable]
-
-        bins = np.histogram_bin_edges(signal_predictions, bins='scott')
-
-        plt.figure()
-        plt.title(f'Distribution of {variable} for Neural Network Signal Output Events', fontsize=FONT_SIZE)
-        plt.xlabel(f'Normalized Value of {variable}', fontsize=FONT_SIZE)
-        plt.ylabel('Number of events', fontsize=FONT_SIZE)
-        plt.tick_params(axis='both', labelsize=FONT_SIZE)
-        plt.hist(signal_predictions, bins=bins, alpha=0.4, label='All Signal Events', color='blue')
-        plt.hist(high_signal_predictions, bins=bins, alpha=0.9, hatch='//', histtype='step', color='red',
-                 label='High Signal Events (NN Output > 0.95)')
-        plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
-
-        plt.show()
-        plt.close()
-
+    performance_plots.save_roc_curve(predictions, outputs, weights, PLOTS_SAVE_PATH)
+    performance_plots.save_histogram_of_predictions(predictions[signal_mask], predictions[~signal_mask],
+                                                    weights[signal_mask], weights[~signal_mask], scores, intervals,
+                                                    PLOTS_SAVE_PATH, 'Neural Network')
 
 
 def get_model(input_neurons: int, trial: optuna.Trial):
@@ -313,7 +206,10 @@ def define_model(input_neurons: int, trial: optuna.Trial):
         model.add(BatchNormalization())
         model.add(Dropout(dropout))
 
-    model.add(Dense(units=1, activation='sigmoid', kernel_initializer=HeNormal(seed=WEIGHTS_SEED_NUMBER)))
+    if MULTICLASS:
+        model.add(Dense(units=len(Config.SAMPLES), activation='softmax', kernel_initializer=HeNormal(seed=WEIGHTS_SEED_NUMBER)))
+    else:
+        model.add(Dense(units=1, activation='sigmoid', kernel_initializer=HeNormal(seed=WEIGHTS_SEED_NUMBER)))
 
     optimizer = None
     if optimizer_name == 'Adam':
@@ -327,52 +223,112 @@ def define_model(input_neurons: int, trial: optuna.Trial):
 
     model.compile(
         optimizer=optimizer,
-        loss='binary_crossentropy',
-        metrics=['binary_crossentropy'],
-        weighted_metrics=['binary_crossentropy']
+        loss=LOSS,
+        metrics=[LOSS],
+        weighted_metrics=[LOSS]
     )
     return model, batch_size
 
 
-def objective(trial, input_train, input_test, output_train, output_test, weights_train, weights_test):
-    global best_neural_network, best_auc_score, best_neural_network_training_history
+def fit_model(neural_network, batch_size, input_train, output_train, weights_train, processes_train, callbacks,
+              verbose=1):
+    if not STRATIFIED_BATCHES:
+        return neural_network.fit(
+            input_train, output_train,
+            epochs=5000,
+            batch_size=batch_size,
+            verbose=verbose,
+            callbacks=callbacks,
+            sample_weight=weights_train,
+            validation_split=VALIDATION_SPLIT,
+            shuffle=True
+        )
 
-    columns_number = input_train.shape[1]
-    neural_network, batch_size = define_model(input_neurons=columns_number, trial=trial)
-    #neural_network, batch_size = get_model(input_neurons=columns_number, trial=trial)
+    # Same events as validation_split: Keras holds out the last fraction of the training data
+    split_at = int(len(input_train) * (1.0 - VALIDATION_SPLIT))
+    input_train = np.asarray(input_train, dtype=np.float32)
+    output_train = np.asarray(output_train, dtype=np.float32)
+    weights_train = np.asarray(weights_train, dtype=np.float32)
+    processes_train = np.asarray(processes_train)
 
-    evaluate_without_dropout = EvaluateWithoutDropout(
-        train_data=(input_train, output_train),
-        sample_weight=weights_train
-    )
-    early_stopping = EarlyStopping(
-        monitor='val_weighted_binary_crossentropy',
-        mode='min',
-        patience=20,
-        restore_best_weights=True,
-        verbose=1
-    )
-    pruning = KerasPruningCallback(
-        trial,
-        'val_weighted_binary_crossentropy'
+    training_batches = StratifiedBatchSequence(
+        input_train[:split_at], output_train[:split_at], weights_train[:split_at], processes_train[:split_at],
+        batch_size=batch_size,
+        seed=GLOBAL_SEED_NUMBER,
+        # With a softmax head the outputs are process indices, so the signal is told apart by its process
+        is_signal=processes_train[:split_at] == event_store.SIGNAL_INDEX
     )
-
-    callbacks = [evaluate_without_dropout, early_stopping, pruning]
-
-    training_history = neural_network.fit(
-        input_train, output_train,
+    return neural_network.fit(
+        training_batches,
         epochs=5000,
-        batch_size=batch_size,
-        verbose=1,
+        verbose=verbose,
         callbacks=callbacks,
-        sample_weight=weights_train,
-        validation_split=0.2,
-        shuffle=True
+        validation_data=(input_train[split_at:], output_train[split_at:], weights_train[split_at:])
     )
 
-    output_predicted = neural_network.predict(input_test).ravel()
-    fpr, tpr, thresholds = roc_curve(output_test, output_predicted, sample_weight=weights_test, drop_intermediate=False)
-    auc_score = auc(fpr, tpr)
+
+def objective(trial, input_train, input_test, output_train, output_test, weights_train, weights_test,
+              significance_weights_test, processes_train):
+    global best_neural_network, best_auc_score, best_neural_network_training_history
+
+    profiler = instrumentation.TrialProfiler(trial.number, TRACE_PATH)
+    try:
+        # Samples the RSS from a background thread, so peaks inside fit and predict are caught
+        with profiler.sampler:
+            with profiler.span('data_conversion', n_events=len(input_train) + len(input_test)):
+                input_train = np.asarray(input_train, dtype=np.float32)
+                input_test = np.asarray(input_test, dtype=np.float32)
+                # With a softmax head the network learns the process index
+                output_train = np.asarray(processes_train if MULTICLASS else output_train, dtype=np.float32)
+                weights_train = np.asarray(weights_train, dtype=np.float32)
+
+            columns_number = input_train.shape[1]
+            with profiler.span('define_model'):
+                neural_network, batch_size = define_model(input_neurons=columns_number, trial=trial)
+                #neural_network, batch_size = get_model(input_neurons=columns_number, trial=trial)
+
+            epoch_profiler = EpochProfiler(profiler, batch_size)
+            evaluate_without_dropout = EvaluateWithoutDropout(
+                train_data=(input_train, output_train),
+                sample_weight=weights_train,
+                profiler=profiler
+            )
+            early_stopping = EarlyStopping(
+                monitor=f'val_weighted_{LOSS}',
+                mode='min',
+                patience=20,
+                restore_best_weights=True,
+                verbose=1
+            )
+            pruning = KerasPruningCallback(
+                trial,
+                f'val_weighted_{LOSS}'
+            )
+
+            callbacks = [epoch_profiler, evaluate_without_dropout, early_stopping, pruning]
+
+            with profiler.span('fit'):
+                training_history = fit_model(neural_network, batch_size, input_train, output_train, weights_train,
+                                             processes_train, callbacks)
+
+            with profiler.span('predict', n_events=len(input_test)):
+                output_predicted = event_store.signal_scores(neural_network.predict(input_test))
+
+            with profiler.span('metrics', n_events=len(input_test)):
+                if OBJECTIVE_AUC_BINS is not None and OPTIMIZATION_METRIC == 'auc':
+                    auc_value, auc_error_bound = metrics.binned_auc(output_predicted, output_test, weights_test,
+                                                                    OBJECTIVE_AUC_BINS)
+                    scores = {'auc': auc_value, 'auc_error_bound': auc_error_bound}
+                else:
+                    scores = metrics.evaluate(output_predicted, output_test, weights_test, significance_weights_test)
+    finally:
+        # Also reached when the pruning callback stops the trial
+        trial.set_user_attr('profile', profiler.summary())
+        profiler.flush()
+
+    for name, value in scores.items():
+        trial.set_user_attr(name, value)
+    auc_score = scores[OPTIMIZATION_METRIC]
 
     if auc_score > best_auc_score:
         best_auc_score = auc_score
@@ -382,7 +338,74 @@ def objective(trial, input_train, input_test, output_train, output_test, weights
     return auc_score
 
 
-def run_optimization(input_train, input_test, output_train, output_test, weights_train, weights_test):
+def train_fold(params, specs, fold):
+    blocks, arrays = kfold.attach_arrays(specs)
+    try:
+        train_mask = arrays['folds'] != fold
+        test_index = np.flatnonzero(~train_mask)
+        # The arrays are in store order, grouped by process; shuffled so that the validation tail Keras holds out
+        # holds every process and training sees all of them
+        train_index = np.random.default_rng([GLOBAL_SEED_NUMBER, fold]).permutation(np.flatnonzero(train_mask))
+
+        input_train = arrays['inputs'][train_index]
+        output_train = arrays['processes' if MULTICLASS else 'outputs'][train_index].astype(np.float32)
+        weights_train = arrays['weights'][train_index]
+
+        neural_network, batch_size = define_model(input_neurons=input_train.shape[1],
+                                                  trial=optuna.trial.FixedTrial(params))
+
+        evaluate_without_dropout = EvaluateWithoutDropout(
+            train_data=(input_train, output_train),
+            sample_weight=weights_train
+        )
+        early_stopping = EarlyStopping(
+            monitor=f'val_weighted_{LOSS}',
+            mode='min',
+            patience=20,
+            restore_best_weights=True,
+            verbose=0
+        )
+
+        fit_model(neural_network, batch_size, input_train, output_train, weights_train,
+                  arrays['processes'][train_index], [evaluate_without_dropout, early_stopping], verbose=0)
+
+        predictions = event_store.signal_scores(neural_network.predict(arrays['inputs'][test_index], verbose=0))
+    finally:
+        kfold.release_arrays(blocks)
+    return test_index, predictions
+
+
+def cross_validated_objective(trial, executor, specs):
+    global best_auc_score, best_out_of_fold_predictions
+
+    # Only registers the trial's hyperparameters; every fold process rebuilds the model from trial.params.
+    # Pruning is not available here because the epochs run in other processes.
+    define_model(input_neurons=specs['inputs'][1][1], trial=trial)
+
+    out_of_fold_predictions, fold_aucs = kfold.cross_validate(executor, train_fold, trial.params, specs, N_FOLDS)
+
+    auc_score = float(np.mean(fold_aucs))
+    trial.set_user_attr('auc_std', float(np.std(fold_aucs)))
+    trial.set_user_attr('fold_aucs', fold_aucs.tolist())
+
+    if auc_score > best_auc_score:
+        best_auc_score = auc_score
+        best_out_of_fold_predictions = out_of_fold_predictions
+
+    return auc_score
+
+
+def save_out_of_fold_predictions(predictions, outputs, weights, significance_weights):
+    np.savez_compressed(
+        OUT_OF_FOLD_SAVE_PATH,
+        predictions=predictions,
+        outputs=np.asarray(outputs),
+        weights=np.asarray(weights),
+        significance_weights=np.asarray(significance_weights)
+    )
+
+
+def run_optimization(objective_function):
     pruner = optuna.pruners.HyperbandPruner(
         min_resource=10,
         max_resource=1500,
@@ -391,16 +414,16 @@ def run_optimization(input_train, input_test, output_train, output_test, weights
     sampler = optuna.samplers.TPESampler()
 
     study = optuna.create_study(
-        study_name='Hyperparameter_optimization',
+        study_name=Config.STUDY_NAME,
         direction='maximize',
-        storage='sqlite:///../03_results/03_neural_network/optimization.db',
+        storage=f'sqlite:///{Config.STUDY_DATABASE_PATH}',
         load_if_exists=True,
         pruner=pruner,
         sampler=sampler
     )
 
     study.optimize(
-        lambda trial: objective(trial, input_train, input_test, output_train, output_test, weights_train, weights_test),
+        objective_function,
         #n_trials=9351741387053047680,
         timeout=86400,#259200
         n_jobs=-1
@@ -410,8 +433,8 @@ def run_optimization(input_train, input_test, output_train, output_test, weights
 
 def show_best(study):
     study = optuna.load_study(
-        study_name='Hyperparameter_optimization',
-        storage='sqlite:///../03_results/03_neural_network/optimization.db'
+        study_name=Config.STUDY_NAME,
+        storage=f'sqlite:///{Config.STUDY_DATABASE_PATH}'
     )
     best_trial = study.best_trial
 
@@ -423,31 +446,80 @@ def show_best(study):
         print(f'\t\t{key}: {value}')
 
 
+def main_cross_validation(input_data, output_data, events_weights, significance_weights, processes):
+    blocks, specs = kfold.share_arrays({
+        'inputs': input_data.to_numpy(dtype=np.float32),
+        'outputs': output_data.to_numpy(dtype=np.float32),
+        'weights': events_weights.to_numpy(dtype=np.float32),
+        'processes': processes.to_numpy(dtype=np.int8),
+        'folds': kfold.assign_folds(output_data.to_numpy(), N_FOLDS, GLOBAL_SEED_NUMBER)
+    })
+
+    try:
+        # TensorFlow is not fork-safe, so fold processes are spawned
+        with ProcessPoolExecutor(max_workers=N_FOLDS, mp_context=multiprocessing.get_context('spawn')) as executor:
+            optimization_history = run_optimization(lambda trial: cross_validated_objective(trial, executor, specs))
+    finally:
+        kfold.release_arrays(blocks, unlink=True)
+
+    show_best(optimization_history)
+    save_out_of_fold_predictions(best_out_of_fold_predictions, output_data, events_weights, significance_weights)
+
+    # The fold networks stay in their processes; the best hyperparameters are refitted once on the stored split, so
+    # that a k-fold run also leaves the model 06, 07 and the pipeline's train stage expect at MODEL_PATH
+    neural_network, training_history = refit_best_trial(optimization_history.best_params)
+    Config.MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    neural_network.save(Config.MODEL_PATH)
+    save_history(training_history)
+
+
+def refit_best_trial(params):
+    input_train, _, output_train, _, weights_train, _, _, _, processes_train, _ = event_store.load_split()
+    input_train = np.asarray(input_train, dtype=np.float32)
+    output_train = np.asarray(processes_train if MULTICLASS else output_train, dtype=np.float32)
+    weights_train = np.asarray(weights_train, dtype=np.float32)
+
+    neural_network, batch_size = define_model(input_neurons=input_train.shape[1],
+                                              trial=optuna.trial.FixedTrial(params))
+    early_stopping = EarlyStopping(
+        monitor=f'val_weighted_{LOSS}',
+        mode='min',
+        patience=20,
+        restore_best_weights=True,
+        verbose=0
+    )
+    training_history = fit_model(neural_network, batch_size, input_train, output_train, weights_train,
+                                 processes_train, [early_stopping], verbose=0)
+    return neural_network, training_history
+
+
 def main():
     global best_neural_network, best_auc_score, best_neural_network_training_history
 
-    input_data, output_data, events_weights, significance_weights = load_data()
+    if N_FOLDS > 1:
+        main_cross_validation(*load_data())
+        return
 
-    input_train, input_test, output_train, output_test, weights_train, weights_test, significance_weights_train, significance_weights_test = train_test_split(
-        input_data, output_data, events_weights, significance_weights,
-        test_size=0.3,
-        shuffle=True,
-        random_state=GLOBAL_SEED_NUMBER,
-        stratify=output_data
-    )
+    # Stored split: the same test events as 06_plots and every other stage
+    input_train, input_test, output_train, output_test, weights_train, weights_test, significance_weights_train, significance_weights_test, processes_train, processes_test = event_store.load_split()
 
-    optimization_history = run_optimization(input_train, input_test, output_train, output_test, weights_train, weights_test)
-    optimization_history.trials_dataframe().to_json('../03_results/03_neural_network/optuna_study_results.json',
-                                                    orient='records',
-                                                    lines=True
-                                                    )
+    optimization_history = run_optimization(
+        lambda trial: objective(trial, input_train, input_test, output_train, output_test, weights_train, weights_test,
+                                significance_weights_test, processes_train)
+    )
+    study_summary.save_trials_table(
+        study_summary.load_trials_table(Config.STUDY_DATABASE_PATH, Config.STUDY_NAME),
+        Config.TRIALS_TABLE_PATH
+    )
 
     show_best(optimization_history)
+    if CHROME_TRACE_PATH is not None:
+        instrumentation.export_chrome_trace(TRACE_PATH, CHROME_TRACE_PATH)
 
-    best_neural_network.save('../03_results/03_neural_network/02_pre-trained_model/tH(bb).hdf5')
+    Config.MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    best_neural_network.save(Config.MODEL_PATH)
     save_history(best_neural_network_training_history)
-    save_roc_curve(best_neural_network, input_test, output_test, weights_test)
-    save_histogram_of_predictions(best_neural_network, input_test, output_test, weights_test, significance_weights_test)
+    save_performance_plots(best_neural_network, input_test, output_test, weights_test, significance_weights_test)
 
 
 if __name__ == '__main__':
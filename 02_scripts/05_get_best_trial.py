@@ -1,46 +1,23 @@
-import optuna
-from optuna.visualization import plot_contour
-from optuna.visualization import plot_edf
-from optuna.visualization import plot_intermediate_values
-from optuna.visualization import plot_optimization_history
-from optuna.visualization import plot_parallel_coordinate
-from optuna.visualization import plot_param_importances
-from optuna.visualization import plot_rank
-from optuna.visualization import plot_slice
-from optuna.visualization import plot_timeline
-import matplotlib.pyplot as plt
-from Tools.scripts.var_access_benchmark import trials
+from pathlib import Path
+import study_summary
+from config import Config
 
+STUDY_NAME = Config.STUDY_NAME
+DATABASE_PATH = Config.STUDY_DATABASE_PATH
+TRIALS_TABLE_PATH = Config.TRIALS_TABLE_PATH
+PLOTS_SAVE_PATH = Config.OPTIMIZATION_PLOTS_SAVE_PATH
 
-def main():
-    study = optuna.load_study(
-        study_name='Hyperparameter_optimization',
-        storage='sqlite:///../03_results/03_neural_network/optimization.db'
-    )
-    total_trials = study.trials
-    pruned_trials = [t for t in total_trials if t.state == optuna.trial.TrialState.PRUNED]
-    complete_trials = [t for t in total_trials if t.state == optuna.trial.TrialState.COMPLETE]
-    failed_trials = [t for t in total_trials if t.state == optuna.trial.TrialState.FAIL]
 
-    print(f'Total number of trials: {len(total_trials)}')
-    print(f'Pruned trials: {len(pruned_trials)}')
-    print(f'Completed trials: {len(complete_trials)}')
-    print(f'Failed trials: {len(failed_trials)}')
+def main():
+    trials_table = study_summary.load_trials_table(DATABASE_PATH, STUDY_NAME)
+    study_summary.save_trials_table(trials_table, TRIALS_TABLE_PATH)
 
-    best_trial = study.best_trial
-    print('Best Neural Network:')
-    print(f'\tID:  {best_trial.number}')
-    print(f'\tAUC: {best_trial.value}')
-    print('\tHyperparameters:')
-    for key, value in best_trial.params.items():
-        print(f'\t\t{key}: {value}')
+    importances = study_summary.param_importances(trials_table)
+    study_summary.print_report(trials_table, importances)
 
-    fig1 = plot_optimization_history(study)
-    fig2 = plot_param_importances(study)
-    fig3 = plot_parallel_coordinate(study) #plot_parallel_coordinate(study, params=["lr", "n_layers"])
-    #fig4 = plot_contour(study, params=["lr", "n_layers"])
+    Path(PLOTS_SAVE_PATH).mkdir(parents=True, exist_ok=True)
+    study_summary.save_history_plots(trials_table, importances, PLOTS_SAVE_PATH)
 
-    #fig2.show()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
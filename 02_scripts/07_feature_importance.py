@@ -0,0 +1,108 @@
+import importlib
+import json
+
+import numpy as np
+import optuna
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.models import load_model
+
+import event_store
+import feature_importance
+import metrics
+from config import Config
+
+SAVE_PATH = Config.FEATURE_IMPORTANCE_PATH
+PERMUTATION_REPEATS = 3
+INFERENCE_BATCH_SIZE = 65536
+# Retrains the best trial's network once per dropped variable; off by default because of the cost
+BACKWARD_ELIMINATION = False
+ELIMINATION_TOLERANCE = 0.002
+ELIMINATION_EPOCHS = 200
+
+neural_network_script = importlib.import_module('04_neural_network')
+
+
+def batched_predict(neural_network):
+    return lambda inputs: event_store.signal_scores(
+        neural_network.predict(inputs, batch_size=INFERENCE_BATCH_SIZE, verbose=0))
+
+
+def fit_best_trial(input_train, output_train, weights_train):
+    study = optuna.load_study(study_name=Config.STUDY_NAME, storage=f'sqlite:///{Config.STUDY_DATABASE_PATH}')
+    params = study.best_trial.params
+    neural_network, batch_size = neural_network_script.define_model(input_train.shape[1],
+                                                                    optuna.trial.FixedTrial(params))
+    early_stopping = EarlyStopping(
+        monitor=f'val_weighted_{neural_network_script.LOSS}',
+        mode='min',
+        patience=20,
+        restore_best_weights=True
+    )
+    neural_network.fit(
+        np.asarray(input_train, dtype=np.float32), np.asarray(output_train, dtype=np.float32),
+        sample_weight=np.asarray(weights_train, dtype=np.float32),
+        epochs=ELIMINATION_EPOCHS,
+        batch_size=batch_size,
+        validation_split=neural_network_script.VALIDATION_SPLIT,
+        callbacks=[early_stopping],
+        verbose=0
+    )
+    return batched_predict(neural_network)
+
+
+def main():
+    SAVE_PATH.mkdir(parents=True, exist_ok=True)
+    _, input_test, _, output_test, _, weights_test, _, _, _, _ = event_store.load_split()
+
+    univariate = feature_importance.univariate_ranking(input_test, output_test, weights_test)
+    univariate.to_csv(SAVE_PATH / 'univariate_ranking.csv')
+    feature_importance.save_ranking_plot(univariate, 'separation_power', 'Univariate Separation Power',
+                                         SAVE_PATH / 'univariate_ranking.png')
+
+    neural_network = load_model(Config.MODEL_PATH)
+    permutation = feature_importance.permutation_importance(batched_predict(neural_network), input_test, output_test,
+                                                            weights_test, PERMUTATION_REPEATS,
+                                                            Config.GLOBAL_SEED_NUMBER)
+    permutation.to_csv(SAVE_PATH / 'permutation_importance.csv')
+    feature_importance.save_ranking_plot(permutation, 'importance', 'Permutation Importance (AUC drop)',
+                                         SAVE_PATH / 'permutation_importance.png', errors='std')
+
+    print(univariate.join(permutation[['importance', 'std']]).to_string())
+
+    if BACKWARD_ELIMINATION:
+        save_backward_elimination(input_test, output_test, weights_test)
+
+
+def save_backward_elimination(input_test, output_test, weights_test):
+    # Retrained on the stored train events and ranked and stopped on the validation events; the test events only
+    # score the selected variables once
+    total_events = event_store.load_events()
+    split = event_store.load_split_index(total_events['process'].to_numpy())
+    # The train rows are sorted by store position, so they are shuffled before Keras holds out its validation tail
+    train_index = np.random.default_rng(Config.GLOBAL_SEED_NUMBER).permutation(split['train'])
+    input_train, output_train, weights_train, _, processes_train = event_store.select(total_events, train_index)
+    input_validation, output_validation, weights_validation, _, _ = event_store.select(total_events,
+                                                                                        split['validation'])
+
+    # The retrained networks follow 04's MULTICLASS setting, so they learn the process index in that mode
+    target_train = processes_train if neural_network_script.MULTICLASS else output_train
+    steps = feature_importance.backward_elimination(fit_best_trial, input_train, target_train, weights_train,
+                                                    input_validation, output_validation, weights_validation,
+                                                    tolerance=ELIMINATION_TOLERANCE,
+                                                    seed=Config.GLOBAL_SEED_NUMBER)
+    steps.to_json(SAVE_PATH / 'backward_elimination.json', orient='records', indent=4)
+    feature_importance.save_elimination_plot(steps, SAVE_PATH / 'backward_elimination.png')
+    for step in steps.itertuples():
+        print(f'{step.n_variables:>2} variables: validation AUC {step.auc:.4f}, '
+              f'least important {step.least_important}')
+
+    variables = feature_importance.selected_variables(steps, ELIMINATION_TOLERANCE)
+    predict = fit_best_trial(input_train[variables], target_train, weights_train)
+    test_auc = metrics.weighted_auc(predict(np.asarray(input_test[variables], dtype=np.float32)), output_test,
+                                    weights_test)
+    with open(SAVE_PATH / 'selected_variables.json', 'w', encoding='utf-8') as json_file:
+        json.dump({'variables': list(variables), 'test_auc': float(test_auc)}, json_file, indent=4)
+    print(f'Selected {len(variables)} variables: test AUC {test_auc:.4f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+import event_store
+import metrics
+import performance_plots
+from config import Config
+
+# Histogram-based gradient boosting on the same events, weights and test split as the neural network; a baseline
+# that trains in minutes instead of a day-long Optuna search
+HYPERPARAMETERS = {
+    'learning_rate': 0.1,
+    'max_iter': 1000,
+    'max_leaf_nodes': 63,
+    'min_samples_leaf': 100,
+    'l2_regularization': 1.0,
+    'max_bins': 255,
+    'early_stopping': True,
+    'n_iter_no_change': 20,
+    'scoring': 'loss',
+    'validation_fraction': 0.2
+}
+INFERENCE_BATCH_SIZE = 1_000_000
+MODEL_NAME = 'Gradient Boosting'
+
+
+def train(input_train, output_train, weights_train):
+    model = HistGradientBoostingClassifier(
+        **HYPERPARAMETERS,
+        random_state=Config.GLOBAL_SEED_NUMBER
+    )
+    model.fit(np.asarray(input_train, dtype=np.float32), np.asarray(output_train),
+              sample_weight=np.asarray(weights_train, dtype=np.float64))
+    return model
+
+
+def predict(model, inputs):
+    inputs = np.asarray(inputs, dtype=np.float32)
+    predictions = np.empty(len(inputs))
+    for start in range(0, len(inputs), INFERENCE_BATCH_SIZE):
+        batch = inputs[start:start + INFERENCE_BATCH_SIZE]
+        predictions[start:start + len(batch)] = model.predict_proba(batch)[:, 1]
+    return predictions
+
+
+def print_comparison(scores):
+    # Side by side with the cached neural network predictions, when 06_plots.evaluate has been run
+    rows = {'Gradient boosting': scores}
+    if Path(Config.PREDICTIONS_PATH).exists():
+        cached = np.load(Config.PREDICTIONS_PATH)
+        rows['Neural network'] = metrics.evaluate(cached['predictions'], cached['outputs'], cached['weights'],
+                                                  cached['significance_weights'])
+
+    print(f'{"":>18} {"AUC":>8} {"Separation":>11} {"Significance":>13}')
+    for name, row in rows.items():
+        print(f'{name:>18} {row["auc"]:>8.4f} {row["separation_power"]:>11.4f} {row["max_significance"]:>13.3f}')
+
+
+def main():
+    input_train, input_test, output_train, output_test, weights_train, weights_test, _, significance_weights_test, _, \
+        processes_test = event_store.load_split()
+
+    start = time.perf_counter()
+    model = train(input_train, output_train, weights_train)
+    print(f'Trained {model.n_iter_} iterations in {time.perf_counter() - start:.0f} s')
+
+    Path(Config.GRADIENT_BOOSTING_MODEL_PATH).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, Config.GRADIENT_BOOSTING_MODEL_PATH)
+
+    # Same cache layout and figures as the neural network, written to the gradient boosting folders
+    for folder in ('01_png', '02_pdf'):
+        (Config.GRADIENT_BOOSTING_PLOTS_SAVE_PATH / folder).mkdir(parents=True, exist_ok=True)
+
+    output_predicted = predict(model, input_test)
+    performance_plots.save_test_predictions(output_predicted, output_test, weights_test, significance_weights_test,
+                                            Config.GRADIENT_BOOSTING_PREDICTIONS_PATH, processes_test)
+    print_comparison(metrics.evaluate(output_predicted, output_test, weights_test, significance_weights_test))
+
+    performance_plots.set_plot_style()
+    performance_plots.plot(Config.GRADIENT_BOOSTING_PREDICTIONS_PATH, Config.GRADIENT_BOOSTING_PLOTS_SAVE_PATH,
+                           Config.GRADIENT_BOOSTING_BOOTSTRAP_SAVE_PATH,
+                           Config.GRADIENT_BOOSTING_BACKGROUND_BREAKDOWN_SAVE_PATH, MODEL_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+from tensorflow.keras.utils import Sequence
+
+
+class StratifiedBatchSequence(Sequence):
+    # Every batch holds a fixed share of each physics process, proportional to the process's effective (summed)
+    # weight, instead of a uniform draw that is ~80% tt. The loss weights are rescaled so that the expected
+    # weighted loss of a batch is the same as with uniform sampling and the original event weights.
+    # is_signal marks the signal events; by default outputs == 1, which only holds for a binary target.
+    def __init__(self, inputs, outputs, weights, processes, batch_size, steps_per_epoch=None, seed=0,
+                 is_signal=None):
+        super().__init__()
+        self.inputs = np.asarray(inputs, dtype=np.float32)
+        self.outputs = np.asarray(outputs, dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float64)
+        processes = np.asarray(processes)
+        is_signal = self.outputs == 1 if is_signal is None else np.asarray(is_signal, dtype=bool)
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+
+        self.process_events = [np.flatnonzero(processes == process) for process in np.unique(processes)]
+        effective_weights = np.array([weights[events].sum() for events in self.process_events])
+        self.quotas = effective_weights / effective_weights.sum()
+
+        # c_i = w_i * (N_p / N) / (W_p / W): the process is drawn W_p / W of the time instead of N_p / N
+        self.loss_weights = np.empty(len(weights), dtype=np.float32)
+        for events, effective_weight in zip(self.process_events, effective_weights):
+            scale = (len(events) / len(weights)) / (effective_weight / weights.sum())
+            self.loss_weights[events] = weights[events] * scale
+
+        if steps_per_epoch is None:
+            # One epoch sees, on average, every signal event once
+            signal_events = np.count_nonzero(is_signal)
+            signal_share = sum(quota for quota, events in zip(self.quotas, self.process_events)
+                               if is_signal[events[0]])
+            steps_per_epoch = math.ceil(signal_events / (signal_share * batch_size))
+        self.steps_per_epoch = steps_per_epoch
+
+    def __len__(self):
+        return self.steps_per_epoch
+
+    def batch_counts(self, rng):
+        # Fixed integer part of every quota plus a multinomial draw of the remainder keeps E[count] exact
+        expected = self.quotas * self.batch_size
+        counts = np.floor(expected).astype(np.int64)
+        remainder = expected - counts
+        missing = self.batch_size - counts.sum()
+        if missing > 0:
+            counts += rng.multinomial(missing, remainder / remainder.sum())
+        return counts
+
+    def __getitem__(self, index):
+        rng = np.random.default_rng([self.seed, self.epoch, index])
+        batch = np.concatenate([
+            events[rng.integers(0, len(events), size=count)]
+            for events, count in zip(self.process_events, self.batch_counts(rng))
+        ])
+        return self.inputs[batch], self.outputs[batch], self.loss_weights[batch]
+
+    def on_epoch_end(self):
+        self.epoch += 1
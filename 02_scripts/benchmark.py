@@ -0,0 +1,233 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import optuna
+
+import bootstrap
+import instrumentation
+import metrics
+import performance_plots
+import synthetic
+from config import Config
+
+DEFAULT_SIZES = [100_000, 1_000_000, 3_000_000]
+DEFAULT_STAGES = ['root2json', 'load_data', 'training', 'metrics', 'bootstrap', 'figures']
+RESULTS_PATH = Config.RESULTS_PATH / '04_benchmarks'
+TRAINING_PARAMS = {
+    'n_hidden_layers': 2,
+    'learning_rate': 1e-4,
+    'optimizer_name': 'Adam',
+    'batch_size': 256,
+    'activation_l1': 'relu',
+    'dropout_l1': 0.2,
+    'n_neurons_l2': 382,
+    'dropout_l2': 0.3,
+    'activation_l2': 'relu',
+    'n_neurons_l3': 127,
+    'dropout_l3': 0.3,
+    'activation_l3': 'relu'
+}
+
+def synthetic_predictions(n_events, seed):
+    rng = np.random.default_rng(seed)
+    sizes = synthetic.process_sizes(n_events)
+    processes = np.repeat(np.arange(len(sizes)), list(sizes.values()))
+    outputs = (processes == 0).astype(np.int64)
+    predictions = 1.0 / (1.0 + np.exp(-rng.normal(-1.0 + 2.0 * outputs, 1.0)))
+    weights = np.array([Config.WEIGHTS[process] for process in Config.SAMPLES])[processes]
+    significance_weights = np.array([Config.SIGNAL_SIGNIFICANCE_WEIGHTS[process]
+                                     for process in Config.SAMPLES])[processes]
+    return predictions, outputs, weights, significance_weights
+
+
+# Each prepare_* function builds the inputs of a stage outside of the timed region and returns the timed callable
+
+def prepare_root2json(n_events, work_path, seed):
+    root2json_script = importlib.import_module('01_root2json')
+    root_folder = work_path / '01_root'
+    root_folder.mkdir(exist_ok=True)
+    (work_path / '02_json').mkdir(exist_ok=True)
+    where_root = str(root_folder / 'MiniNtuple_tt_benchmark.root')
+    synthetic.write_sample(where_root, 'tt', n_events, seed)
+    return lambda: root2json_script.root2json(where_root)
+
+
+def prepare_load_data(n_events, work_path, seed):
+    neural_network_script = importlib.import_module('04_neural_network')
+    json_paths = {}
+    for process, size in synthetic.process_sizes(n_events).items():
+        json_paths[process] = str(work_path / f'{process}.json')
+        synthetic.write_json(json_paths[process], synthetic.generate_events(process, size, seed))
+    return lambda: neural_network_script.load_data(json_paths)
+
+
+def prepare_training(n_events, work_path, seed):
+    neural_network_script = importlib.import_module('04_neural_network')
+
+    _, outputs, weights, _ = synthetic_predictions(n_events, seed)
+    rng = np.random.default_rng(seed)
+    inputs = rng.random((n_events, len(Config.VARIABLES_DESCRIPTION)), dtype=np.float32)
+    inputs[:, 0] += 0.5 * outputs
+
+    model, batch_size = neural_network_script.define_model(inputs.shape[1], optuna.trial.FixedTrial(TRAINING_PARAMS))
+    return lambda: model.fit(inputs, outputs, sample_weight=weights, epochs=1, batch_size=batch_size, verbose=0)
+
+
+def prepare_metrics(n_events, work_path, seed):
+    predictions, outputs, weights, significance_weights = synthetic_predictions(n_events, seed)
+    return lambda: metrics.evaluate(predictions, outputs, weights, significance_weights)
+
+
+def prepare_bootstrap(n_events, work_path, seed):
+    predictions, outputs, weights, significance_weights = synthetic_predictions(n_events, seed)
+    return lambda: bootstrap.bootstrap(predictions, outputs, weights, significance_weights, n_replicas=1000, seed=seed)
+
+
+def prepare_figures(n_events, work_path, seed):
+    save_path = work_path / 'plots'
+    (save_path / '01_png').mkdir(parents=True, exist_ok=True)
+    (save_path / '02_pdf').mkdir(parents=True, exist_ok=True)
+    performance_plots.set_plot_style()
+
+    predictions, outputs, weights, significance_weights = synthetic_predictions(n_events, seed)
+    scores = metrics.evaluate(predictions, outputs, weights, significance_weights)
+    intervals = bootstrap.bootstrap(predictions, outputs, weights, significance_weights, n_replicas=10, n_workers=1)
+    signal_mask = outputs == 1
+
+    def render():
+        performance_plots.save_roc_curve(predictions, outputs, weights, save_path)
+        performance_plots.save_histogram_of_predictions(predictions[signal_mask], predictions[~signal_mask],
+                                                        weights[signal_mask], weights[~signal_mask], scores,
+                                                        intervals, save_path, 'Neural Network')
+        performance_plots.save_significances(predictions, outputs, significance_weights, scores, save_path)
+
+    return render
+
+
+STAGES = {
+    'root2json': prepare_root2json,
+    'load_data': prepare_load_data,
+    'training': prepare_training,
+    'metrics': prepare_metrics,
+    'bootstrap': prepare_bootstrap,
+    'figures': prepare_figures
+}
+
+
+def run_stage(stage, n_events, repeat, seed):
+    # Runs in a fresh process. The repeats are timed without tracing; memory is measured in one more, untimed run,
+    # as the RSS growth over what the process held after the stage's setup.
+    with tempfile.TemporaryDirectory(prefix='atlas_benchmark_') as work_folder:
+        timed = STAGES[stage](n_events, Path(work_folder), seed)
+        setup_rss = instrumentation.current_rss()
+
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            timed()
+            durations.append(time.perf_counter() - start)
+
+        start_rss = instrumentation.current_rss()
+        tracemalloc.start()
+        with instrumentation.RssSampler() as sampler:
+            timed()
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    best = min(durations)
+    return {
+        'stage': stage,
+        'n_events': n_events,
+        'seconds': best,
+        'seconds_all': durations,
+        'events_per_second': n_events / best if best > 0 else None,
+        'peak_traced_memory': peak_traced,
+        'setup_rss': setup_rss,
+        'peak_rss': sampler.peak,
+        'stage_rss': max(sampler.peak - start_rss, 0)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(baseline_results, results, tolerance):
+    baseline = {(result['stage'], result['n_events']): result for result in baseline_results['results']}
+    regressions = []
+    for result in results['results']:
+        reference = baseline.get((result['stage'], result['n_events']))
+        if reference is None:
+            continue
+        ratio = result['seconds'] / reference['seconds']
+        # Results written before stage_rss was recorded only hold the process-wide peak
+        memory = 'stage_rss' if 'stage_rss' in reference else 'peak_rss'
+        memory_ratio = result[memory] / reference[memory] if reference[memory] > 0 else 1.0
+        flag = 'REGRESSION' if ratio > 1.0 + tolerance or memory_ratio > 1.0 + tolerance else ''
+        print(f'{result["stage"]:>10} {result["n_events"]:>9}: time x{ratio:.2f}, '
+              f'{memory.replace("_rss", " RSS")} x{memory_ratio:.2f} {flag}')
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic MiniNtuple data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=DEFAULT_STAGES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=Config.GLOBAL_SEED_NUMBER)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='Results file of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown before flagging')
+    arguments = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': []
+    }
+
+    context = multiprocessing.get_context('spawn')
+    for n_events in arguments.sizes:
+        for stage in arguments.stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_stage, stage, n_events, arguments.repeat, arguments.seed).result()
+            print(f'{stage:>10} {n_events:>9}: {result["seconds"]:.3f} s, '
+                  f'stage RSS {result["stage_rss"] / 2 ** 20:.0f} MiB (setup {result["setup_rss"] / 2 ** 20:.0f} MiB)')
+            results['results'].append(result)
+
+    output = arguments.output or f'{RESULTS_PATH}/benchmark_{commit}.json'
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as json_file:
+        json.dump(results, json_file, indent=4)
+
+    if arguments.compare is not None:
+        with open(arguments.compare, encoding='utf-8') as json_file:
+            regressions = compare(json.load(json_file), results, arguments.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+
+FINE_BINS = 1000
+REPLICAS_PER_TASK = 50
+
+
+def compress_events(predictions, outputs, weights, significance_weights, n_bins=FINE_BINS):
+    # Poisson bootstrap: each event gets a Poisson(1) multiplicity. Events that share the score bin, class and both
+    # weights are interchangeable and the sum of their multiplicities is Poisson(count), so one draw per group of
+    # identical events is exact and needs far fewer random numbers than one draw per event.
+    predictions = np.asarray(predictions, dtype=np.float64).ravel()
+    is_signal = (np.asarray(outputs).ravel() == 1).astype(np.int64)
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64).ravel(), predictions.shape)
+    significance_weights = np.broadcast_to(np.asarray(significance_weights, dtype=np.float64).ravel(),
+                                           predictions.shape)
+
+    bin_index = np.clip((predictions * n_bins).astype(np.int64), 0, n_bins - 1)
+    keys = np.column_stack((is_signal, bin_index, weights, significance_weights))
+    groups, counts = np.unique(keys, axis=0, return_counts=True)
+
+    return {
+        'is_signal': groups[:, 0].astype(bool),
+        'bin_index': groups[:, 1].astype(np.int64),
+        'weight': groups[:, 2],
+        'significance_weight': groups[:, 3],
+        'count': counts,
+        'n_bins': n_bins
+    }
+
+
+def replica_histograms(groups, multiplicities):
+    # multiplicities: (replicas, groups) -> four (replicas, n_bins) weighted histograms
+    n_bins = groups['n_bins']
+    n_replicas = multiplicities.shape[0]
+    histograms = {}
+
+    for label, mask in (('signal', groups['is_signal']), ('background', ~groups['is_signal'])):
+        for prefix, weights in (('', groups['weight']), ('significance_', groups['significance_weight'])):
+            weighted = multiplicities[:, mask] * weights[mask]
+            histogram = np.zeros((n_replicas, n_bins))
+            # Groups come out of np.unique sorted by class and then by bin, so every bin is a contiguous slice
+            bins, starts = np.unique(groups['bin_index'][mask], return_index=True)
+            if len(bins):
+                histogram[:, bins] = np.add.reduceat(weighted, starts, axis=1)
+            histograms[prefix + label] = histogram
+
+    return histograms
+
+
+def metrics_from_histograms(histograms, bin_edges=metrics.BIN_EDGES, cuts=metrics.SIGNIFICANCE_CUTS):
+    signal = histograms['signal']
+    background = histograms['background']
+    n_bins = signal.shape[1]
+
+    signal_total = signal.sum(axis=1)
+    background_total = background.sum(axis=1)
+    signal_above = signal_total[:, None] - np.cumsum(signal, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        auc = np.sum(background * (signal_above + 0.5 * signal), axis=1) / (signal_total * background_total)
+
+    # Separation power on the coarse plotting binning; its edges must coincide with fine bin edges
+    coarse_bins = len(bin_edges) - 1
+    rebin = n_bins // coarse_bins
+    coarse_signal = signal.reshape(-1, coarse_bins, rebin).sum(axis=2)
+    coarse_background = background.reshape(-1, coarse_bins, rebin).sum(axis=2)
+    separation_power = np.array([
+        metrics.separation_power_from_histograms(signal_hist, background_hist)
+        for signal_hist, background_hist in zip(coarse_signal, coarse_background)
+    ])
+
+    # S / sqrt(S + B) for the scores above each cut, as in metrics.evaluate; the cuts must be fine bin edges
+    cut_bins = np.rint(np.asarray(cuts) * n_bins).astype(np.int64)
+    empty = np.zeros((signal.shape[0], 1))
+    selected_signal = np.hstack((np.cumsum(histograms['significance_signal'][:, ::-1], axis=1)[:, ::-1],
+                                 empty))[:, cut_bins]
+    selected_background = np.hstack((np.cumsum(histograms['significance_background'][:, ::-1], axis=1)[:, ::-1],
+                                     empty))[:, cut_bins]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        significances = np.where((selected_signal > 0) & (selected_background > 0),
+                                 selected_signal / np.sqrt(selected_signal + selected_background), 0.0)
+    max_significance = significances.max(axis=1)
+
+    return {'auc': auc, 'separation_power': separation_power, 'max_significance': max_significance}
+
+
+def run_replicas(groups, n_replicas, seed, bin_edges=metrics.BIN_EDGES, cuts=metrics.SIGNIFICANCE_CUTS):
+    rng = np.random.default_rng(seed)
+    multiplicities = rng.poisson(groups['count'], size=(n_replicas, len(groups['count']))).astype(np.float64)
+    return metrics_from_histograms(replica_histograms(groups, multiplicities), bin_edges, cuts)
+
+
+def bootstrap(predictions, outputs, weights, significance_weights, n_replicas=1000, confidence_level=0.68,
+              seed=0, n_workers=1, n_bins=FINE_BINS, bin_edges=metrics.BIN_EDGES, cuts=metrics.SIGNIFICANCE_CUTS):
+    if n_bins % (len(bin_edges) - 1):
+        raise ValueError(f'n_bins={n_bins} must be a multiple of the {len(bin_edges) - 1} coarse bins')
+    if not np.allclose(np.rint(np.asarray(cuts) * n_bins) / n_bins, cuts):
+        raise ValueError(f'The significance cuts must lie on the edges of the {n_bins} fine bins')
+
+    groups = compress_events(predictions, outputs, weights, significance_weights, n_bins)
+
+    chunks = [REPLICAS_PER_TASK] * (n_replicas // REPLICAS_PER_TASK)
+    if n_replicas % REPLICAS_PER_TASK:
+        chunks.append(n_replicas % REPLICAS_PER_TASK)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    # The replicas take about a second for a million events, less than starting worker processes that re-import the
+    # calling script (TensorFlow in 06); extra workers are threads, which share the groups without copying them
+    if n_workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(n_workers, len(chunks))) as executor:
+            results = list(executor.map(run_replicas, [groups] * len(chunks), chunks, seeds,
+                                        [bin_edges] * len(chunks), [cuts] * len(chunks)))
+    else:
+        results = [run_replicas(groups, chunk, chunk_seed, bin_edges, cuts)
+                   for chunk, chunk_seed in zip(chunks, seeds)]
+
+    # Nominal values on the same binning, so the intervals are centred consistently
+    nominal = metrics_from_histograms(replica_histograms(groups, groups['count'][None, :].astype(np.float64)),
+                                      bin_edges, cuts)
+
+    tail = (1.0 - confidence_level) / 2.0 * 100
+    intervals = {}
+    for name in nominal:
+        replicas = np.concatenate([result[name] for result in results])
+        low, high = np.nanpercentile(replicas, [tail, 100 - tail])
+        intervals[name] = {
+            'nominal': float(nominal[name][0]),
+            'low': float(low),
+            'high': float(high),
+            'std': float(np.nanstd(replicas))
+        }
+    return intervals
@@ -1,4 +1,170 @@
+import os
+from pathlib import Path
+
+
 class Config:
+    PROJECT_PATH = Path(__file__).resolve().parent.parent
+    SCRIPTS_PATH = PROJECT_PATH / '02_scripts'
+    # ATLAS_SYNTHETIC_DATA=1 runs every stage on the samples written by 00_synthetic_data.py, with its own results
+    # folder, so the real samples and results are left untouched
+    USE_SYNTHETIC_DATA = os.environ.get('ATLAS_SYNTHETIC_DATA', '0') == '1'
+    SYNTHETIC_DATA_PATH = PROJECT_PATH / '01_src' / '02_synthetic'
+    DATA_PATH = SYNTHETIC_DATA_PATH if USE_SYNTHETIC_DATA else PROJECT_PATH / '01_src' / '01_data'
+    ROOT_FOLDER = DATA_PATH / '01_root'
+    JSON_FOLDER = DATA_PATH / '02_json'
+    EVENT_STORE_PATH = DATA_PATH / '03_store' / 'events.parquet'
+    # Row indices of the train/validation/test events in the store, written together with it
+    SPLIT_PATH = DATA_PATH / '03_store' / 'split.npz'
+    TEST_SIZE = 0.3
+    # Share of the non-test events used for validation
+    VALIDATION_SIZE = 0.2
+    # Read the normalized events from EVENT_STORE_PATH when it exists instead of parsing the JSON files
+    USE_EVENT_STORE = True
+
+    RESULTS_PATH = PROJECT_PATH / '03_results' / '00_synthetic' if USE_SYNTHETIC_DATA else PROJECT_PATH / '03_results'
+    DISTRIBUTIONS_SAVE_PATH = RESULTS_PATH / '01_variables_distributions'
+    CORRELATION_MATRIX_SAVE_PATH = RESULTS_PATH / 'correlation_matrix_tzbq.png'
+    NEURAL_NETWORK_PATH = RESULTS_PATH / '03_neural_network'
+    PLOTS_SAVE_PATH = NEURAL_NETWORK_PATH / '01_performance_plots'
+    MODEL_PATH = NEURAL_NETWORK_PATH / '02_pre-trained_model' / 'tH(bb).hdf5'
+    OPTIMIZATION_PLOTS_SAVE_PATH = NEURAL_NETWORK_PATH / '03_optimization_plots'
+    STUDY_NAME = 'Hyperparameter_optimization'
+    STUDY_DATABASE_PATH = NEURAL_NETWORK_PATH / 'optimization.db'
+    TRIALS_TABLE_PATH = NEURAL_NETWORK_PATH / 'optuna_trials.parquet'
+    PREDICTIONS_PATH = NEURAL_NETWORK_PATH / 'test_predictions.npz'
+    OUT_OF_FOLD_SAVE_PATH = NEURAL_NETWORK_PATH / 'out_of_fold_predictions.npz'
+    BOOTSTRAP_SAVE_PATH = NEURAL_NETWORK_PATH / 'bootstrap_intervals.json'
+    BACKGROUND_BREAKDOWN_SAVE_PATH = NEURAL_NETWORK_PATH / 'background_breakdown.json'
+    TRACE_PATH = NEURAL_NETWORK_PATH / 'trace.jsonl'
+    FEATURE_IMPORTANCE_PATH = NEURAL_NETWORK_PATH / '04_feature_importance'
+    GRADIENT_BOOSTING_PATH = RESULTS_PATH / '05_gradient_boosting'
+    GRADIENT_BOOSTING_PLOTS_SAVE_PATH = GRADIENT_BOOSTING_PATH / '01_performance_plots'
+    GRADIENT_BOOSTING_MODEL_PATH = GRADIENT_BOOSTING_PATH / '02_pre-trained_model' / 'tH(bb).joblib'
+    GRADIENT_BOOSTING_PREDICTIONS_PATH = GRADIENT_BOOSTING_PATH / 'test_predictions.npz'
+    GRADIENT_BOOSTING_BOOTSTRAP_SAVE_PATH = GRADIENT_BOOSTING_PATH / 'bootstrap_intervals.json'
+    GRADIENT_BOOSTING_BACKGROUND_BREAKDOWN_SAVE_PATH = GRADIENT_BOOSTING_PATH / 'background_breakdown.json'
+
+    WEIGHTS_SEED_NUMBER = 35
+    GLOBAL_SEED_NUMBER = 5
+
+    # File stem and tree name of each MiniNtuple sample; tHbq is the signal
+    SAMPLES = {
+        'tHbq': ('MiniNtuple_tHbq_SM_300K', 'aTTreethbqSM'),
+        'tt': ('MiniNtuple_tt_SM_3M', 'aTTreett'),
+        'ttbb': ('MiniNtuple_ttbb_SM_300K', 'aTTreett'),
+        'ttH': ('MiniNtuple_ttH_SM_100K', 'aTTreetth'),
+        'tZbq': ('MiniNtuple_tzbq_SM_100K', 'aTTreethbq')
+    }
+    SIGNAL_PROCESS = 'tHbq'
+    ROOT_PATHS = {
+        "tHbq": ROOT_FOLDER / 'MiniNtuple_tHbq_SM_300K.root',
+        "tt": ROOT_FOLDER / 'MiniNtuple_tt_SM_3M.root',
+        "ttbb": ROOT_FOLDER / 'MiniNtuple_ttbb_SM_300K.root',
+        "ttH": ROOT_FOLDER / 'MiniNtuple_ttH_SM_100K.root',
+        "tZbq": ROOT_FOLDER / 'MiniNtuple_tzbq_SM_100K.root'
+    }
+    JSON_PATHS = {
+        "tHbq": JSON_FOLDER / 'MiniNtuple_tHbq_SM_300K_(aTTreethbqSM;1).json',
+        "tt": JSON_FOLDER / 'MiniNtuple_tt_SM_3M_(aTTreett;1).json',
+        "ttbb": JSON_FOLDER / 'MiniNtuple_ttbb_SM_300K_(aTTreett;1).json',
+        "ttH": JSON_FOLDER / 'MiniNtuple_ttH_SM_100K_(aTTreetth;1).json',
+        "tZbq": JSON_FOLDER / 'MiniNtuple_tzbq_SM_100K_(aTTreethbq;1).json'
+    }
+
+    WEIGHTS = {
+        "tHbq": 2.0,
+        "tt": 1.0,
+        "ttbb": 1.862340,
+        "ttH": 0.268164,
+        "tZbq": 0.085833
+    }
+
+    SIGNAL_SIGNIFICANCE_WEIGHTS = {
+        "tHbq": 0.00932265,
+        "tt": 0.0537442,
+        "ttbb": 0.100090,
+        "ttH": 0.0144123,
+        "tZbq": 0.00461306
+    }
+
+    # Pipeline stages run by pipeline.py: script module, functions called in order, upstream stages, and the files
+    # whose content decides whether the stage is stale (the script and every local module it imports are always
+    # included)
+    PIPELINE_WORKERS = 3
+    PIPELINE_CACHE_PATH = RESULTS_PATH / 'pipeline_cache.json'
+    PIPELINE_STAGES = {
+        'convert': {
+            'script': '01_root2json',
+            'functions': ['main'],
+            'depends': [],
+            'inputs': list(ROOT_PATHS.values()),
+            'outputs': list(JSON_PATHS.values())
+        },
+        'load': {
+            'script': 'event_store',
+            'functions': ['main'],
+            'depends': ['convert'],
+            'inputs': list(JSON_PATHS.values()),
+            'outputs': [EVENT_STORE_PATH, SPLIT_PATH]
+        },
+        'distributions': {
+            'script': '02_variables_distributions',
+            'functions': ['set_plot_style', 'main'],
+            'depends': ['convert'],
+            'inputs': list(JSON_PATHS.values()),
+            'outputs': [DISTRIBUTIONS_SAVE_PATH]
+        },
+        'correlation': {
+            'script': '03_correlation_matrix',
+            'functions': ['main'],
+            'depends': ['convert'],
+            'inputs': list(JSON_PATHS.values()),
+            'outputs': [CORRELATION_MATRIX_SAVE_PATH]
+        },
+        'train': {
+            'script': '04_neural_network',
+            'functions': ['set_plot_style', 'main'],
+            'depends': ['load'],
+            'inputs': [EVENT_STORE_PATH, SPLIT_PATH],
+            'outputs': [MODEL_PATH]
+        },
+        'study': {
+            'script': '05_get_best_trial',
+            'functions': ['main'],
+            'depends': ['train'],
+            'inputs': [STUDY_DATABASE_PATH],
+            'outputs': [TRIALS_TABLE_PATH]
+        },
+        'evaluate': {
+            'script': '06_plots',
+            'functions': ['evaluate'],
+            'depends': ['train'],
+            'inputs': [EVENT_STORE_PATH, SPLIT_PATH, MODEL_PATH],
+            'outputs': [PREDICTIONS_PATH]
+        },
+        'plot': {
+            'script': '06_plots',
+            'functions': ['set_plot_style', 'plot'],
+            'depends': ['evaluate'],
+            'inputs': [PREDICTIONS_PATH, EVENT_STORE_PATH, SPLIT_PATH],
+            'outputs': [PLOTS_SAVE_PATH / '01_png' / 'prediction.png', BOOTSTRAP_SAVE_PATH]
+        },
+        'importance': {
+            'script': '07_feature_importance',
+            'functions': ['main'],
+            'depends': ['train'],
+            'inputs': [EVENT_STORE_PATH, SPLIT_PATH, MODEL_PATH],
+            'outputs': [FEATURE_IMPORTANCE_PATH / 'permutation_importance.csv']
+        },
+        'boosting': {
+            'script': '08_gradient_boosting',
+            'functions': ['main'],
+            'depends': ['load'],
+            'inputs': [EVENT_STORE_PATH, SPLIT_PATH],
+            'outputs': [GRADIENT_BOOSTING_MODEL_PATH, GRADIENT_BOOSTING_PREDICTIONS_PATH]
+        }
+    }
+
     VARIABLES_DESCRIPTION = {
         'lead_lep_charge': 'Charge of the leading lepton',
         'HT_alljets': 'Algebraic Sum of all transverse momenta',
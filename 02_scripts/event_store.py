@@ -0,0 +1,155 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+# Columns added to the branches of every sample
+LABEL_COLUMNS = ['process', 'signal', 'weight', 'significance_weight']
+# Process index of the signal sample, also its class in the multi-class networks
+SIGNAL_INDEX = list(Config.SAMPLES).index(Config.SIGNAL_PROCESS)
+# Normalized value of a variable whose branch is empty in an event (None in the JSON files): below the signal
+# range [0, 1], so the models can tell it apart, and finite, so nothing downstream sees NaN
+MISSING_VALUE = -1.0
+
+
+def normalize(data, max_value=None, min_value=None):
+    if not isinstance(data, pd.DataFrame):
+        data = data.to_frame()
+
+    if max_value is None and min_value is None:
+        max_value = data.max()
+        min_value = data.min()
+
+    data = (data - min_value) / (max_value - min_value)
+    return data, max_value, min_value
+
+
+def signal_scores(predictions):
+    # Sigmoid output as is; for a softmax head over the processes, the signal class probability
+    predictions = np.asarray(predictions)
+    if predictions.ndim == 2 and predictions.shape[1] > 1:
+        return predictions[:, SIGNAL_INDEX]
+    return predictions.ravel()
+
+
+def read_samples(json_paths=None):
+    # Every sample is scaled with the minimum and maximum of the signal sample, ignoring missing values, which are
+    # then set to MISSING_VALUE
+    json_paths = json_paths or Config.JSON_PATHS
+    samples = {process: pd.read_json(json_paths[process]) for process in Config.SAMPLES}
+
+    variables = list(Config.VARIABLES_DESCRIPTION)
+    signal_events = samples[Config.SIGNAL_PROCESS]
+    signal_events[variables], max_value, min_value = normalize(signal_events[variables])
+    for process, events in samples.items():
+        if process != Config.SIGNAL_PROCESS:
+            events[variables], _, _ = normalize(events[variables], max_value, min_value)
+    for events in samples.values():
+        events[variables] = events[variables].fillna(MISSING_VALUE)
+
+    for index, (process, events) in enumerate(samples.items()):
+        events['process'] = index
+        events['signal'] = int(process == Config.SIGNAL_PROCESS)
+        events['weight'] = Config.WEIGHTS[process]
+        events['significance_weight'] = Config.SIGNAL_SIGNIFICANCE_WEIGHTS[process]
+
+    return pd.concat(list(samples.values()), ignore_index=True)
+
+
+def save_event_store(total_events, where_parquet):
+    Path(where_parquet).parent.mkdir(parents=True, exist_ok=True)
+    total_events.to_parquet(where_parquet, index=False)
+
+
+def load_event_store(where_parquet):
+    return pd.read_parquet(where_parquet)
+
+
+def load_events(json_paths=None):
+    # Explicit JSON paths (benchmarks, synthetic samples) always bypass the store
+    if Config.USE_EVENT_STORE and json_paths is None and Path(Config.EVENT_STORE_PATH).exists():
+        return load_event_store(Config.EVENT_STORE_PATH)
+    return read_samples(json_paths)
+
+
+def make_split(processes, test_size=Config.TEST_SIZE, validation_size=Config.VALIDATION_SIZE,
+               seed=Config.GLOBAL_SEED_NUMBER):
+    # Row indices of the train, validation and test events, drawn separately in every sample so that each keeps
+    # its share. The validation total is the tail Keras would hold out with validation_split=validation_size.
+    processes = np.asarray(processes)
+    counts = np.bincount(processes, minlength=len(Config.SAMPLES))
+    rest_counts = counts - np.round(counts * test_size).astype(np.int64)
+    n_rest = rest_counts.sum()
+    n_validation = n_rest - int(n_rest * (1.0 - validation_size))
+
+    # Largest remainder, so that the per-sample validation counts add up to n_validation exactly
+    quotas = rest_counts * (n_validation / n_rest) if n_rest > 0 else np.zeros(len(counts))
+    validation_counts = np.floor(quotas).astype(np.int64)
+    remainders = np.argsort(validation_counts - quotas, kind='stable')
+    validation_counts[remainders[:n_validation - validation_counts.sum()]] += 1
+
+    order = np.argsort(processes, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    split = {'train': [], 'validation': [], 'test': []}
+    for process, count in enumerate(counts):
+        rows = order[starts[process]:starts[process] + count]
+        rows = rows[np.random.default_rng([seed, process]).permutation(count)]
+        n_test = count - rest_counts[process]
+        split['test'].append(rows[:n_test])
+        split['validation'].append(rows[n_test:n_test + validation_counts[process]])
+        split['train'].append(rows[n_test + validation_counts[process]:])
+
+    # Sorted indices make every later selection a forward gather over the store
+    split = {name: np.sort(np.concatenate(parts)).astype(np.int32) for name, parts in split.items()}
+    split['counts'] = counts
+    split['parameters'] = np.array([test_size, validation_size, seed], dtype=np.float64)
+    return split
+
+
+def save_split(split, where_npz):
+    Path(where_npz).parent.mkdir(parents=True, exist_ok=True)
+    np.savez(where_npz, **split)
+
+
+def load_split_index(processes, where_npz=Config.SPLIT_PATH, test_size=Config.TEST_SIZE,
+                     validation_size=Config.VALIDATION_SIZE, seed=Config.GLOBAL_SEED_NUMBER):
+    # The stored index is reused as long as it was made for the same number of events in every sample and with the
+    # same split sizes and seed; otherwise the split is redrawn
+    counts = np.bincount(np.asarray(processes), minlength=len(Config.SAMPLES))
+    parameters = np.array([test_size, validation_size, seed], dtype=np.float64)
+    if Path(where_npz).exists():
+        with np.load(where_npz) as stored:
+            if 'parameters' in stored.files and np.array_equal(stored['parameters'], parameters) \
+                    and np.array_equal(stored['counts'], counts):
+                return {name: stored[name] for name in stored.files}
+    return make_split(processes, test_size, validation_size, seed)
+
+
+def select(total_events, index):
+    # Rows are gathered by index; the full frame is never shuffled or copied
+    events = total_events.iloc[index]
+    return (events.drop(columns=LABEL_COLUMNS), events['signal'], events['weight'], events['significance_weight'],
+            events['process'])
+
+
+def load_split(json_paths=None):
+    # Same order as sklearn's train_test_split: input_train, input_test, output_train, output_test, ... The training
+    # part is the train events followed by the validation events, so Keras' validation_split holds out the stored
+    # validation events.
+    total_events = load_events(json_paths)
+    split = load_split_index(total_events['process'].to_numpy())
+    train = select(total_events, np.concatenate((split['train'], split['validation'])))
+    test = select(total_events, split['test'])
+    return [part for pair in zip(train, test) for part in pair]
+
+
+def main():
+    total_events = read_samples()
+    save_event_store(total_events, Config.EVENT_STORE_PATH)
+    save_split(make_split(total_events['process'].to_numpy()), Config.SPLIT_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+import metrics
+
+FONT_SIZE = 14
+N_BINS = 40
+AUC_BINS = 10000
+# Rows scored per inference call: the permuted copies of the test split are stacked up to this size
+MAX_BATCH_ROWS = 4_000_000
+
+
+def stacked_histograms(values, is_signal, weights, n_bins, low=0.0, high=1.0):
+    # values is (n_rows, n_events): every row is histogrammed with one bincount over row * n_bins + bin.
+    # low and high are scalars or one value per row.
+    n_rows, n_events = values.shape
+    low = np.reshape(low, (-1, 1))
+    width = np.reshape(high, (-1, 1)) - low
+    width = np.where(width > 0, width, 1.0)
+    bin_index = np.clip(((values - low) * (n_bins / width)).astype(np.int64), 0, n_bins - 1)
+
+    offsets = np.arange(n_rows, dtype=np.int64)[:, None] * n_bins
+    signal_hist = np.bincount((bin_index[:, is_signal] + offsets).ravel(),
+                              weights=np.tile(weights[is_signal], n_rows), minlength=n_rows * n_bins)
+    background_hist = np.bincount((bin_index[:, ~is_signal] + offsets).ravel(),
+                                  weights=np.tile(weights[~is_signal], n_rows), minlength=n_rows * n_bins)
+    return signal_hist.reshape(n_rows, n_bins), background_hist.reshape(n_rows, n_bins)
+
+
+def auc_from_histograms(signal_hist, background_hist):
+    # Row-wise binned AUC, pairs sharing a bin scored as ties (see metrics.binned_auc)
+    signal_total = signal_hist.sum(axis=-1)
+    background_total = background_hist.sum(axis=-1)
+    signal_above = signal_total[:, None] - np.cumsum(signal_hist, axis=-1)
+    return np.sum(background_hist * (signal_above + 0.5 * signal_hist), axis=-1) / (signal_total * background_total)
+
+
+def univariate_ranking(inputs, outputs, weights, n_bins=N_BINS):
+    # Separation power and AUC of each variable on its own, from weighted histograms over its full range
+    values = np.asarray(inputs, dtype=np.float64).T
+    is_signal = np.asarray(outputs).ravel() == 1
+    weights = np.asarray(weights, dtype=np.float64).ravel()
+
+    signal_hist, background_hist = stacked_histograms(values, is_signal, weights, n_bins,
+                                                      values.min(axis=1), values.max(axis=1))
+    auc_scores = auc_from_histograms(signal_hist, background_hist)
+    ranking = pd.DataFrame({
+        'separation_power': metrics.separation_power_from_histograms(signal_hist, background_hist),
+        # Direction-free: a variable that is lower for signal separates as well as one that is higher
+        'auc': np.maximum(auc_scores, 1.0 - auc_scores)
+    }, index=pd.Index(inputs.columns, name='variable'))
+    return ranking.sort_values('separation_power', ascending=False)
+
+
+def permutation_importance(predict, inputs, outputs, weights, n_repeats=3, seed=0, n_bins=AUC_BINS,
+                           max_batch_rows=MAX_BATCH_ROWS):
+    # Drop of the test AUC when one variable is shuffled. The permuted copies are stacked and scored together,
+    # so predict sees a few large arrays instead of n_variables * n_repeats small ones.
+    names = list(inputs.columns)
+    inputs = np.asarray(inputs, dtype=np.float32)
+    is_signal = np.asarray(outputs).ravel() == 1
+    weights = np.asarray(weights, dtype=np.float64).ravel()
+    n_events, n_variables = inputs.shape
+    rng = np.random.default_rng(seed)
+
+    baseline_predictions = np.asarray(predict(inputs)).reshape(1, n_events)
+    baseline = auc_from_histograms(*stacked_histograms(baseline_predictions, is_signal, weights, n_bins))[0]
+
+    tasks = [(variable, repeat) for variable in range(n_variables) for repeat in range(n_repeats)]
+    copies_per_batch = max(1, max_batch_rows // n_events)
+    auc_scores = np.empty(len(tasks))
+    for start in range(0, len(tasks), copies_per_batch):
+        batch_tasks = tasks[start:start + copies_per_batch]
+        stacked = np.tile(inputs, (len(batch_tasks), 1))
+        for copy, (variable, _) in enumerate(batch_tasks):
+            stacked[copy * n_events:(copy + 1) * n_events, variable] = inputs[rng.permutation(n_events), variable]
+
+        predictions = np.asarray(predict(stacked)).reshape(len(batch_tasks), n_events)
+        auc_scores[start:start + len(batch_tasks)] = auc_from_histograms(
+            *stacked_histograms(predictions, is_signal, weights, n_bins))
+
+    drops = baseline - auc_scores.reshape(n_variables, n_repeats)
+    ranking = pd.DataFrame({
+        'importance': drops.mean(axis=1),
+        'std': drops.std(axis=1),
+        'baseline_auc': baseline
+    }, index=pd.Index(names, name='variable'))
+    return ranking.sort_values('importance', ascending=False)
+
+
+def backward_elimination(fit, input_train, output_train, weights_train, input_validation, output_validation,
+                         weights_validation, min_variables=1, tolerance=0.002, n_repeats=1, seed=0):
+    # Greedy: retrain on the remaining variables, drop the one with the lowest permutation importance and stop
+    # once the validation AUC falls more than tolerance below the best seen. One training per step, not per variable.
+    # fit(input_train, output_train, weights_train) returns a predict callable. The test events are left out, so
+    # that the selected variables can be scored on them once.
+    variables = list(input_train.columns)
+    steps = []
+    best_auc = -np.inf
+    while True:
+        predict = fit(input_train[variables], output_train, weights_train)
+        ranking = permutation_importance(predict, input_validation[variables], output_validation, weights_validation,
+                                         n_repeats, seed)
+        auc_score = float(ranking['baseline_auc'].iloc[0])
+        least_important = ranking.index[-1]
+        steps.append({
+            'n_variables': len(variables),
+            'auc': auc_score,
+            'least_important': least_important,
+            'variables': list(variables)
+        })
+
+        best_auc = max(best_auc, auc_score)
+        if auc_score < best_auc - tolerance or len(variables) <= min_variables:
+            break
+        variables.remove(least_important)
+
+    return pd.DataFrame(steps)
+
+
+def selected_variables(steps, tolerance=0.002):
+    # Smallest variable set whose validation AUC is within tolerance of the best step
+    return steps[steps['auc'] >= steps['auc'].max() - tolerance].iloc[-1]['variables']
+
+
+def save_ranking_plot(ranking, column, title, where_png, errors=None):
+    plt.figure(figsize=(8, 0.3 * len(ranking) + 2))
+    plt.title(title, fontsize=FONT_SIZE)
+    plt.xlabel(column.replace('_', ' ').capitalize(), fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.barh(ranking.index[::-1], ranking[column].values[::-1],
+             xerr=None if errors is None else ranking[errors].values[::-1], color='blue')
+    plt.tight_layout()
+    plt.savefig(where_png, dpi=300)
+    plt.close()
+
+
+def save_elimination_plot(steps, where_png):
+    plt.figure()
+    plt.title('Backward Elimination', fontsize=FONT_SIZE)
+    plt.xlabel('Number of variables', fontsize=FONT_SIZE)
+    plt.ylabel('Validation AUC', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.plot(steps['n_variables'], steps['auc'], marker='o', color='blue')
+    plt.gca().invert_xaxis()
+    plt.savefig(where_png, dpi=300)
+    plt.close()
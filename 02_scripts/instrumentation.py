@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage; the memory figures are reported as 0
+    resource = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_trace_lock = threading.Lock()
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    # Largest resident set size seen while the block runs, sampled from a background thread. ru_maxrss can not be
+    # reset, so it would also count whatever the process allocated before the block.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class TrialProfiler:
+    # Records timed spans of one Optuna trial. The trial's peak RSS is the largest RSS seen by the sampler, which
+    # runs while the trial body is inside `with profiler.sampler:`, and at the span boundaries; RSS is per process,
+    # so with n_jobs > 1 it includes every trial running at the same time. process_peak_rss is the process
+    # high-water mark, earlier trials included.
+    def __init__(self, trial_number, trace_path=None):
+        self.trial_number = trial_number
+        self.trace_path = trace_path
+        self.records = []
+        self.peak_rss = current_rss()
+        self.sampler = RssSampler()
+
+    def add(self, name, start, duration, n_events=None, **attributes):
+        rss = current_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        record = {
+            'name': name,
+            'trial': self.trial_number,
+            'thread': threading.get_ident(),
+            'start': start,
+            'duration': duration,
+            'rss': rss,
+            'process_peak_rss': peak_rss()
+        }
+        if n_events is not None:
+            record['n_events'] = n_events
+            record['events_per_second'] = n_events / duration if duration > 0 else None
+        record.update(attributes)
+        self.records.append(record)
+
+    @contextmanager
+    def span(self, name, n_events=None, **attributes):
+        self.peak_rss = max(self.peak_rss, current_rss())
+        start = time.time()
+        counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - counter, n_events, **attributes)
+
+    def summary(self):
+        summary = {}
+        for record in self.records:
+            phase = summary.setdefault(record['name'], {'count': 0, 'duration': 0.0, 'n_events': 0})
+            phase['count'] += 1
+            phase['duration'] += record['duration']
+            phase['n_events'] += record.get('n_events') or 0
+        for phase in summary.values():
+            phase['events_per_second'] = phase['n_events'] / phase['duration'] if phase['duration'] > 0 else None
+        summary['peak_rss'] = max(self.peak_rss, self.sampler.peak)
+        summary['process_peak_rss'] = peak_rss()
+        return summary
+
+    def flush(self):
+        if self.trace_path is None or not self.records:
+            return
+        with _trace_lock, open(self.trace_path, 'a', encoding='utf-8') as trace_file:
+            for record in self.records:
+                trace_file.write(json.dumps(record) + '\n')
+        self.records = []
+
+
+def export_chrome_trace(trace_path, where_json):
+    # Complete ("X") events for chrome://tracing / Perfetto: one row per thread, trials as event arguments
+    events = []
+    with open(trace_path, encoding='utf-8') as trace_file:
+        for line in trace_file:
+            record = json.loads(line)
+            events.append({
+                'name': record['name'],
+                'cat': f'trial {record["trial"]}',
+                'ph': 'X',
+                'ts': record['start'] * 1e6,
+                'dur': record['duration'] * 1e6,
+                'pid': 0,
+                'tid': record['thread'],
+                'args': {key: value for key, value in record.items()
+                         if key not in ('name', 'start', 'duration', 'thread')}
+            })
+
+    with open(where_json, 'w', encoding='utf-8') as json_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, json_file)
@@ -0,0 +1,64 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+import metrics
+
+
+def share_arrays(arrays):
+    # Copy arrays into named shared memory blocks once; fold processes attach to them by name instead of
+    # receiving pickled copies of the training data
+    blocks = []
+    specs = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def release_arrays(blocks, unlink=False):
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def assign_folds(outputs, n_folds, seed):
+    folds = np.empty(len(outputs), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for fold, (_, test_index) in enumerate(splitter.split(np.zeros(len(outputs)), outputs)):
+        folds[test_index] = fold
+    return folds
+
+
+def cross_validate(executor, worker, params, specs, n_folds):
+    # worker(params, specs, fold) -> (test_index, predictions), one fold per process
+    futures = [executor.submit(worker, params, specs, fold) for fold in range(n_folds)]
+
+    blocks, arrays = attach_arrays(specs)
+    try:
+        out_of_fold = np.full(len(arrays['outputs']), np.nan, dtype=np.float32)
+        fold_aucs = []
+        for future in futures:
+            test_index, predictions = future.result()
+            out_of_fold[test_index] = predictions
+            fold_aucs.append(metrics.weighted_auc(predictions, arrays['outputs'][test_index],
+                                                  arrays['weights'][test_index]))
+    finally:
+        release_arrays(blocks)
+
+    return out_of_fold, np.array(fold_aucs)
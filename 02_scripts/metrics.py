@@ -0,0 +1,173 @@
+import numpy as np
+
+BIN_EDGES = np.linspace(0, 1, 41)
+# Cuts scanned for the maximum S / sqrt(S + B), shared by evaluate, the significance plots and the bootstrap (whose
+# fine bin edges must include them). A cut at 1 would only keep saturated scores and is left out.
+SIGNIFICANCE_CUTS = np.linspace(0, 1, 201)[:-1]
+METRICS = ('auc', 'separation_power', 'max_significance', 'optimal_threshold')
+
+
+def sort_predictions(predictions, outputs, weights, significance_weights=None):
+    predictions = np.asarray(predictions, dtype=np.float64).ravel()
+    is_signal = np.asarray(outputs).ravel() == 1
+    if significance_weights is None:
+        significance_weights = weights
+
+    # One descending sort serves every metric below
+    order = np.argsort(predictions, kind='stable')[::-1]
+    sorted_predictions = predictions[order]
+    sorted_is_signal = is_signal[order]
+
+    # Events with equal scores cannot be separated by a cut, so only the last one of each run is kept
+    last_of_run = np.empty(len(sorted_predictions), dtype=bool)
+    last_of_run[:-1] = sorted_predictions[1:] != sorted_predictions[:-1]
+    last_of_run[-1:] = True
+
+    def accumulate(values):
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64).ravel(), predictions.shape)[order]
+        signal = np.cumsum(np.where(sorted_is_signal, values, 0.0))[last_of_run]
+        background = np.cumsum(np.where(sorted_is_signal, 0.0, values))[last_of_run]
+        return signal, background
+
+    signal, background = accumulate(weights)
+    significance_signal, significance_background = accumulate(significance_weights)
+
+    return {
+        'thresholds': sorted_predictions[last_of_run],
+        'signal': signal,
+        'background': background,
+        'significance_signal': significance_signal,
+        'significance_background': significance_background
+    }
+
+
+def weight_above(thresholds, cumulative, cuts, strict=False):
+    # Total weight of events with score >= cut (> cut if strict); thresholds are in descending order
+    ascending = thresholds[::-1]
+    side = 'right' if strict else 'left'
+    count = len(ascending) - np.searchsorted(ascending, np.asarray(cuts, dtype=np.float64), side=side)
+    return np.where(count > 0, cumulative[np.maximum(count - 1, 0)], 0.0) if len(cumulative) else np.zeros(np.shape(cuts))
+
+
+def histogram(thresholds, cumulative, bin_edges=BIN_EDGES):
+    # Same convention as np.histogram: half-open bins, the last one closed on the right
+    above = weight_above(thresholds, cumulative, bin_edges)
+    above[-1] = weight_above(thresholds, cumulative, bin_edges[-1:], strict=True)[0]
+    return above[:-1] - above[1:]
+
+
+def auc_from_sorted(sorted_scores):
+    signal = sorted_scores['signal']
+    background = sorted_scores['background']
+    if len(signal) == 0 or signal[-1] <= 0 or background[-1] <= 0:
+        return np.nan
+
+    tpr = np.concatenate(([0.0], signal / signal[-1]))
+    fpr = np.concatenate(([0.0], background / background[-1]))
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) * 0.5)
+
+
+def separation_power_from_sorted(sorted_scores, bin_edges=BIN_EDGES):
+    signal_hist = histogram(sorted_scores['thresholds'], sorted_scores['signal'], bin_edges)
+    background_hist = histogram(sorted_scores['thresholds'], sorted_scores['background'], bin_edges)
+    return separation_power_from_histograms(signal_hist, background_hist)
+
+
+def separation_power_from_histograms(signal_hist, background_hist):
+    # Histograms stacked along the first axis give one separation power per row
+    signal_hist = signal_hist / np.sum(signal_hist, axis=-1, keepdims=True)
+    background_hist = background_hist / np.sum(background_hist, axis=-1, keepdims=True)
+
+    total = signal_hist + background_hist
+    terms = np.divide((signal_hist - background_hist) ** 2, total, out=np.zeros_like(total), where=total > 0)
+    separation = 0.5 * np.sum(terms, axis=-1)
+    return float(separation) if separation.ndim == 0 else separation
+
+
+def significance_from_sorted(sorted_scores, cuts=None):
+    # S / sqrt(S + B) for the selection score >= cut; every distinct score is a candidate cut by default
+    if cuts is None:
+        signal = sorted_scores['significance_signal']
+        background = sorted_scores['significance_background']
+    else:
+        thresholds = sorted_scores['thresholds']
+        signal = weight_above(thresholds, sorted_scores['significance_signal'], cuts)
+        background = weight_above(thresholds, sorted_scores['significance_background'], cuts)
+
+    selected = (signal > 0) & (background > 0)
+    significances = np.zeros(len(signal))
+    significances[selected] = signal[selected] / np.sqrt(signal[selected] + background[selected])
+    return significances
+
+
+def evaluate(predictions, outputs, weights, significance_weights=None, bin_edges=BIN_EDGES, cuts=SIGNIFICANCE_CUTS):
+    sorted_scores = sort_predictions(predictions, outputs, weights, significance_weights)
+
+    significances = significance_from_sorted(sorted_scores, cuts)
+    best = int(np.argmax(significances)) if len(significances) else None
+    has_optimum = best is not None and significances[best] > 0
+
+    return {
+        'auc': auc_from_sorted(sorted_scores),
+        'separation_power': separation_power_from_sorted(sorted_scores, bin_edges),
+        'max_significance': float(significances[best]) if has_optimum else 0.0,
+        'optimal_threshold': float(cuts[best]) if has_optimum else None
+    }
+
+
+def weighted_auc(predictions, outputs, weights, n_bins=None):
+    if n_bins is not None:
+        return binned_auc(predictions, outputs, weights, n_bins)[0]
+    return auc_from_sorted(sort_predictions(predictions, outputs, weights))
+
+
+def binned_auc(predictions, outputs, weights, n_bins=10000, value_range=(0.0, 1.0)):
+    # No sort: events are counted into n_bins equal-width bins and pairs sharing a bin are scored as ties.
+    # Only their ordering is unknown, so the result is within error_bound of the exact AUC.
+    predictions = np.asarray(predictions, dtype=np.float64).ravel()
+    is_signal = np.asarray(outputs).ravel() == 1
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64).ravel(), predictions.shape)
+
+    low, high = value_range
+    bin_index = np.clip(((predictions - low) * (n_bins / (high - low))).astype(np.int64), 0, n_bins - 1)
+    signal_hist = np.bincount(bin_index[is_signal], weights=weights[is_signal], minlength=n_bins)
+    background_hist = np.bincount(bin_index[~is_signal], weights=weights[~is_signal], minlength=n_bins)
+
+    signal_total = signal_hist.sum()
+    background_total = background_hist.sum()
+    if signal_total <= 0 or background_total <= 0:
+        return np.nan, np.nan
+
+    signal_above = signal_total - np.cumsum(signal_hist)
+    normalization = signal_total * background_total
+    auc_score = np.sum(background_hist * (signal_above + 0.5 * signal_hist)) / normalization
+    error_bound = 0.5 * np.sum(signal_hist * background_hist) / normalization
+    return float(auc_score), float(error_bound)
+
+
+def roc_curve_points(predictions, outputs, weights, n_points=1000):
+    # ROC curve for plotting: at most n_points vertices spread evenly along the curve
+    sorted_scores = sort_predictions(predictions, outputs, weights)
+    signal = sorted_scores['signal']
+    background = sorted_scores['background']
+
+    tpr = np.concatenate(([0.0], signal / signal[-1]))
+    fpr = np.concatenate(([0.0], background / background[-1]))
+    thresholds = np.concatenate(([np.inf], sorted_scores['thresholds']))
+
+    if len(tpr) > n_points:
+        path = (tpr + fpr) * 0.5
+        keep = np.unique(np.searchsorted(path, np.linspace(0, 1, n_points)))
+        keep = np.unique(np.concatenate(([0], np.minimum(keep, len(path) - 1), [len(path) - 1])))
+        fpr, tpr, thresholds = fpr[keep], tpr[keep], thresholds[keep]
+
+    return fpr, tpr, thresholds
+
+
+def separation_power(predictions, outputs, weights, bin_edges=BIN_EDGES):
+    return separation_power_from_sorted(sort_predictions(predictions, outputs, weights), bin_edges)
+
+
+def significance_curve(predictions, outputs, significance_weights, cuts=SIGNIFICANCE_CUTS):
+    sorted_scores = sort_predictions(predictions, outputs, significance_weights)
+    return significance_from_sorted(sorted_scores, cuts)
@@ -0,0 +1,284 @@
+import json
+
+import numpy as np
+import matplotlib.pyplot as plt
+import scienceplots
+
+from config import Config
+import metrics
+import bootstrap
+import event_store
+import response_plots
+
+# Figures and cached predictions shared by the neural network (06) and the gradient boosting baseline (08). Nothing
+# here imports TensorFlow, so the baseline keeps its threads and does not load the network's runtime.
+FONT_SIZE = 14
+# Score cuts of the per-variable response plots of the signal events, all drawn in one pass (empty to skip)
+RESPONSE_CUTS = [0.5, 0.8, 0.95]
+PROCESS_COLORS = {'tt': 'blue', 'ttbb': 'green', 'ttH': 'orange', 'tZbq': 'purple'}
+BOOTSTRAP_REPLICAS = 1000
+
+
+def set_plot_style():
+    plt.style.use(['science', 'notebook', 'grid'])
+    plt.rcParams.update({
+        'font.size': FONT_SIZE,
+        'pdf.fonttype': 42,
+        'axes.formatter.useoffset': False,
+        'axes.formatter.offset_threshold': 1
+    })
+
+
+def save_roc_curve(predictions, outputs, weights, save_path):
+    fpr, tpr, thresholds = metrics.roc_curve_points(predictions, outputs, weights)
+    auc_score = metrics.weighted_auc(predictions, outputs, weights)
+
+    plt.figure()
+    plt.title('Receiver Operating Characteristic', fontsize=FONT_SIZE)
+    plt.ylabel('True Positive Rate', fontsize=FONT_SIZE)
+    plt.xlabel('False Positive Rate', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.plot(fpr, tpr, color='blue', label='ROC curve (AUC = %0.4f)' % auc_score)
+    plt.plot([0, 1], [0, 1], color='red', linestyle='--')
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+
+    plt.savefig(f'{save_path}/01_png/roc_curve.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/roc_curve.pdf',)
+    plt.close()
+
+
+def save_histogram_of_predictions(signal_predictions, background_predictions, signal_weights, background_weights,
+                                  scores, intervals, save_path, model_name):
+    bin_edges = metrics.BIN_EDGES
+    separation_power = scores['separation_power']
+    max_significance = scores['max_significance']
+    separation_power_error = intervals['separation_power']['std']
+    max_significance_error = intervals['max_significance']['std']
+
+    plt.figure()
+    plt.title(f'Histogram of {model_name} Output', fontsize=FONT_SIZE)
+    plt.xlabel('Predicted Probability', fontsize=FONT_SIZE)
+    plt.ylabel('Number of events', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.hist(signal_predictions, bins=bin_edges, alpha=0.9, hatch='//', histtype='step', label='Signal (pp → tH)',
+             color='red', weights=signal_weights)
+    plt.hist(background_predictions, bins=bin_edges, alpha=0.4, label='Background', color='blue', weights=background_weights)
+    plt.legend(loc='upper center', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+    plt.annotate(f'Separation Power: ({separation_power * 100:.2f} ± {separation_power_error * 100:.2f})%\n'
+                 f'Signal Significance: {max_significance:.2f} ± {max_significance_error:.2f}',
+                 xy=(0.3, 0.80), xycoords='axes fraction', fontsize=FONT_SIZE, verticalalignment='top',
+                bbox=dict(boxstyle="square,pad=0.3", fc="white", ec="black", lw=1))
+
+    plt.savefig(f'{save_path}/01_png/prediction.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/prediction.pdf')
+    plt.close()
+
+
+def save_significances(predictions, outputs, significance_weights, scores, save_path):
+    # Same cuts as the maximum in scores, so the marked threshold sits at the top of the curve
+    cuts = metrics.SIGNIFICANCE_CUTS
+    significances = metrics.significance_curve(predictions, outputs, significance_weights, cuts=cuts)
+    optimal_threshold = scores['optimal_threshold']
+
+    plt.figure()
+    plt.plot(cuts, significances, color='blue')
+    # No threshold when no cut keeps both signal and background
+    if optimal_threshold is not None:
+        plt.axvline(x=optimal_threshold, color='r', linestyle='--', label=f'Best threshold = {optimal_threshold:.3f}')
+        plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+    plt.title('Signal Significance vs Threshold', fontsize=FONT_SIZE)
+    plt.xlabel('Classification Threshold', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.ylabel('Signal Significance', fontsize=FONT_SIZE)
+
+    plt.savefig(f'{save_path}/01_png/significances.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/significances.pdf')
+    plt.close()
+
+
+def save_bootstrap_intervals(intervals, where_json):
+    for name, interval in intervals.items():
+        print(f'{name}: {interval["nominal"]:.4f} [{interval["low"]:.4f}, {interval["high"]:.4f}]')
+
+    with open(where_json, 'w', encoding='utf-8') as json_file:
+        json.dump(intervals, json_file, indent=4)
+
+
+def save_response_plots(predictions, outputs, save_path, model_name, cuts=RESPONSE_CUTS):
+    # Inputs of the cached test events are gathered from the store with the stored split, so the model is not rerun
+    total_events = event_store.load_events()
+    if len(predictions) == len(total_events):
+        # Out-of-fold predictions cover every event in store order
+        index = np.arange(len(total_events))
+    else:
+        index = event_store.load_split_index(total_events['process'].to_numpy())['test']
+
+    signal_mask = outputs == 1
+    inputs = total_events.iloc[index[signal_mask]].drop(columns=event_store.LABEL_COLUMNS)
+    # Missing values are left out of the histograms rather than piled up in the first bin
+    values = inputs.to_numpy(dtype=np.float64, copy=True)
+    values[values == event_store.MISSING_VALUE] = np.nan
+    response_plots.save_response_plots(values, predictions[signal_mask], list(inputs.columns), cuts, save_path,
+                                       model_name)
+
+
+def background_processes():
+    return [(index, process) for index, process in enumerate(Config.SAMPLES) if process != Config.SIGNAL_PROCESS]
+
+
+def save_process_roc_curves(predictions, weights, processes, save_path, class_predictions=None):
+    # Signal against each background alone. With a softmax head the pairwise discriminant p_s / (p_s + p_b) is used,
+    # which is what a dedicated binary network for that background would approximate.
+    is_signal = processes == event_store.SIGNAL_INDEX
+
+    plt.figure()
+    plt.title('Receiver Operating Characteristic per Background', fontsize=FONT_SIZE)
+    plt.ylabel('True Positive Rate', fontsize=FONT_SIZE)
+    plt.xlabel('False Positive Rate', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    for index, process in background_processes():
+        mask = is_signal | (processes == index)
+        if class_predictions is None:
+            scores = predictions[mask]
+        else:
+            signal_probability = class_predictions[mask, event_store.SIGNAL_INDEX]
+            scores = signal_probability / np.maximum(signal_probability + class_predictions[mask, index], 1e-12)
+        fpr, tpr, _ = metrics.roc_curve_points(scores, is_signal[mask], weights[mask])
+        auc_score = metrics.weighted_auc(scores, is_signal[mask], weights[mask])
+        plt.plot(fpr, tpr, color=PROCESS_COLORS.get(process), label=f'{process} (AUC = {auc_score:.4f})')
+    plt.plot([0, 1], [0, 1], color='red', linestyle='--')
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+
+    plt.savefig(f'{save_path}/01_png/process_roc_curves.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/process_roc_curves.pdf')
+    plt.close()
+
+
+def save_process_significances(predictions, significance_weights, processes, scores, save_path):
+    # Significance of the signal against each background alone, for a cut on the common signal score
+    cuts = metrics.SIGNIFICANCE_CUTS
+    is_signal = processes == event_store.SIGNAL_INDEX
+
+    plt.figure()
+    plt.title('Signal Significance per Background', fontsize=FONT_SIZE)
+    plt.xlabel('Classification Threshold', fontsize=FONT_SIZE)
+    plt.ylabel('Signal Significance', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.plot(cuts, metrics.significance_curve(predictions, is_signal, significance_weights, cuts=cuts),
+             color='black', label='All backgrounds')
+    for index, process in background_processes():
+        mask = is_signal | (processes == index)
+        significances = metrics.significance_curve(predictions[mask], is_signal[mask], significance_weights[mask],
+                                                   cuts=cuts)
+        plt.plot(cuts, significances, color=PROCESS_COLORS.get(process), label=f'{process} only')
+    if scores['optimal_threshold'] is not None:
+        plt.axvline(x=scores['optimal_threshold'], color='r', linestyle='--')
+    plt.yscale('log')
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+
+    plt.savefig(f'{save_path}/01_png/process_significances.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/process_significances.pdf')
+    plt.close()
+
+
+def save_background_breakdown(predictions, weights, significance_weights, processes, scores, save_path, where_json,
+                              model_name):
+    # Stacked output per background, and the expected yield of each process above the optimal threshold
+    bin_edges = metrics.BIN_EDGES
+    n_processes = len(Config.SAMPLES)
+    threshold = scores['optimal_threshold'] if scores['optimal_threshold'] is not None else 0.5
+    above = predictions >= threshold
+    total_yields = np.bincount(processes, weights=significance_weights, minlength=n_processes)
+    selected_yields = np.bincount(processes[above], weights=significance_weights[above], minlength=n_processes)
+    background_yield = sum(selected_yields[index] for index, _ in background_processes())
+
+    breakdown = {'threshold': threshold}
+    for index, process in enumerate(Config.SAMPLES):
+        breakdown[process] = {
+            'yield': float(selected_yields[index]),
+            'efficiency': float(selected_yields[index] / total_yields[index]) if total_yields[index] > 0 else 0.0,
+            'background_share': None if index == event_store.SIGNAL_INDEX or background_yield <= 0
+            else float(selected_yields[index] / background_yield)
+        }
+        print(f'{process}: yield {breakdown[process]["yield"]:.4g}, efficiency {breakdown[process]["efficiency"]:.4f}')
+    with open(where_json, 'w', encoding='utf-8') as json_file:
+        json.dump(breakdown, json_file, indent=4)
+
+    backgrounds = background_processes()
+    plt.figure()
+    plt.title(f'Histogram of {model_name} Output per Process', fontsize=FONT_SIZE)
+    plt.xlabel('Predicted Probability', fontsize=FONT_SIZE)
+    plt.ylabel('Number of events', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.hist([predictions[processes == index] for index, _ in backgrounds], bins=bin_edges, stacked=True, alpha=0.6,
+             weights=[weights[processes == index] for index, _ in backgrounds],
+             color=[PROCESS_COLORS.get(process) for _, process in backgrounds],
+             label=[process for _, process in backgrounds])
+    signal_mask = processes == event_store.SIGNAL_INDEX
+    plt.hist(predictions[signal_mask], bins=bin_edges, alpha=0.9, hatch='//', histtype='step', color='red',
+             weights=weights[signal_mask], label='Signal (pp → tH)')
+    plt.axvline(x=threshold, color='black', linestyle='--')
+    plt.yscale('log')
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+
+    plt.savefig(f'{save_path}/01_png/process_predictions.png', dpi=300)
+    plt.savefig(f'{save_path}/02_pdf/process_predictions.pdf')
+    plt.close()
+
+
+def save_test_predictions(predictions, outputs, weights, significance_weights, where_npz, processes=None,
+                          class_predictions=None):
+    # processes enables the per-background plots; class_predictions holds the softmax output of a multi-class model
+    optional = {'processes': processes, 'class_predictions': class_predictions}
+    np.savez_compressed(
+        where_npz,
+        predictions=predictions,
+        outputs=np.asarray(outputs),
+        weights=np.asarray(weights),
+        significance_weights=np.asarray(significance_weights),
+        **{name: np.asarray(values) for name, values in optional.items() if values is not None}
+    )
+
+
+def load_cached_predictions(where_npz):
+    with np.load(where_npz) as cached:
+        return {name: cached[name] for name in cached.files}
+
+
+def plot(predictions_path, save_path, bootstrap_path, breakdown_path, model_name, response_cuts=RESPONSE_CUTS):
+    # Every figure of one model from its cached test predictions
+    cached = load_cached_predictions(predictions_path)
+    output_predicted = cached['predictions']
+    output_test = cached['outputs']
+    weights_test = cached['weights']
+    significance_weights_test = cached['significance_weights']
+
+    signal_mask = output_test == 1
+    background_mask = output_test == 0
+
+    signal_weights = weights_test[signal_mask]
+    background_weights = weights_test[background_mask]
+
+    signal_predictions = output_predicted[signal_mask]
+    background_predictions = output_predicted[background_mask]
+
+    scores = metrics.evaluate(output_predicted, output_test, weights_test, significance_weights_test)
+
+    intervals = bootstrap.bootstrap(output_predicted, output_test, weights_test, significance_weights_test,
+                                    n_replicas=BOOTSTRAP_REPLICAS, seed=Config.GLOBAL_SEED_NUMBER)
+    save_bootstrap_intervals(intervals, bootstrap_path)
+
+    save_roc_curve(output_predicted, output_test, weights_test, save_path)
+    save_histogram_of_predictions(signal_predictions, background_predictions, signal_weights, background_weights,
+                                  scores, intervals, save_path, model_name)
+    save_significances(output_predicted, output_test, significance_weights_test, scores, save_path)
+
+    if 'processes' in cached:
+        class_predictions = cached.get('class_predictions')
+        save_process_roc_curves(output_predicted, weights_test, cached['processes'], save_path, class_predictions)
+        save_process_significances(output_predicted, significance_weights_test, cached['processes'], scores, save_path)
+        save_background_breakdown(output_predicted, weights_test, significance_weights_test, cached['processes'],
+                                  scores, save_path, breakdown_path, model_name)
+
+    if response_cuts:
+        save_response_plots(output_predicted, output_test, save_path, model_name, response_cuts)
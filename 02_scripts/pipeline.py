@@ -0,0 +1,160 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+HASH_CHUNK_SIZE = 2 ** 20
+
+
+def select_stages(stages, targets):
+    # The requested stages together with everything upstream of them
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(stages[name]['depends'])
+    return selected
+
+
+def hash_file(path, digest):
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+
+def imported_names(where_py):
+    # Top-level names of import statements and of importlib.import_module('...') calls
+    names = set()
+    for node in ast.walk(ast.parse(Path(where_py).read_text(encoding='utf-8'))):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+        elif isinstance(node, ast.Call) and getattr(node.func, 'attr', None) == 'import_module' and node.args \
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+            names.add(node.args[0].value.split('.')[0])
+    return names
+
+
+def local_modules(script):
+    # The stage script and every module of the scripts folder it imports, directly or through other modules
+    modules = set()
+    pending = [script]
+    while pending:
+        name = pending.pop()
+        where_py = Config.SCRIPTS_PATH / f'{name}.py'
+        if name in modules or not where_py.is_file():
+            continue
+        modules.add(name)
+        pending.extend(imported_names(where_py))
+    return sorted(modules)
+
+
+def stage_hash(stage):
+    # Content of the inputs and of the local modules the stage script runs; a missing input hashes as a marker
+    digest = hashlib.sha256()
+    paths = list(stage['inputs']) + [Config.SCRIPTS_PATH / f'{module}.py' for module in local_modules(stage['script'])]
+    for path in paths:
+        path = Path(path)
+        digest.update(str(path).encode())
+        if path.is_file():
+            hash_file(path, digest)
+        else:
+            digest.update(b'missing')
+    digest.update(json.dumps(stage['functions']).encode())
+    return digest.hexdigest()
+
+
+def load_cache(where_json):
+    if not Path(where_json).exists():
+        return {}
+    with open(where_json, encoding='utf-8') as json_file:
+        return json.load(json_file)
+
+
+def save_cache(cache, where_json):
+    Path(where_json).parent.mkdir(parents=True, exist_ok=True)
+    with open(where_json, 'w', encoding='utf-8') as json_file:
+        json.dump(cache, json_file, indent=4)
+
+
+def is_fresh(name, stage, cache):
+    return cache.get(name) == stage_hash(stage) and all(Path(path).exists() for path in stage['outputs'])
+
+
+def run_stage(name, script, functions):
+    # Runs in a spawned process: the scripts use relative imports of their neighbours and set global seeds
+    os.chdir(Config.SCRIPTS_PATH)
+    module = importlib.import_module(script)
+    start = time.perf_counter()
+    for function in functions:
+        getattr(module, function)()
+    return name, time.perf_counter() - start
+
+
+def run_pipeline(targets=None, force=False, n_workers=Config.PIPELINE_WORKERS, dry_run=False):
+    stages = Config.PIPELINE_STAGES
+    selected = select_stages(stages, targets or list(stages))
+    cache = load_cache(Config.PIPELINE_CACHE_PATH)
+
+    # A stage runs when it is stale or when any of its upstream stages runs; its hash is recorded once it finishes
+    done, rerun, running = set(), set(), {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as executor:
+        while len(done) < len(selected):
+            for name in sorted(selected - done - set(running.values())):
+                stage = stages[name]
+                if not all(dependency in done for dependency in stage['depends']):
+                    continue
+                upstream_rerun = any(dependency in rerun for dependency in stage['depends'])
+                if not force and not upstream_rerun and is_fresh(name, stage, cache):
+                    logging.info(f'{name}: up to date')
+                    done.add(name)
+                    continue
+                rerun.add(name)
+                if dry_run:
+                    logging.info(f'{name}: would run {stage["script"]}.{", ".join(stage["functions"])}')
+                    done.add(name)
+                    continue
+                logging.info(f'{name}: running {stage["script"]}')
+                running[executor.submit(run_stage, name, stage['script'], stage['functions'])] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                _, duration = future.result()
+                logging.info(f'{name}: finished in {duration:.1f} s')
+                cache[name] = stage_hash(stages[name])
+                save_cache(cache, Config.PIPELINE_CACHE_PATH)
+                done.add(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the analysis stages, skipping those whose inputs are unchanged')
+    parser.add_argument('--stages', nargs='+', choices=list(Config.PIPELINE_STAGES), default=None,
+                        help='Stages to bring up to date, together with their upstream stages (default: all)')
+    parser.add_argument('--force', action='store_true', help='Run the selected stages even when up to date')
+    parser.add_argument('--workers', type=int, default=Config.PIPELINE_WORKERS)
+    parser.add_argument('--dry-run', action='store_true', help='Only report which stages would run')
+    arguments = parser.parse_args()
+
+    run_pipeline(arguments.stages, arguments.force, arguments.workers, arguments.dry_run)
+
+
+if __name__ == '__main__':
+    main()
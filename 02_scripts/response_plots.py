@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+FONT_SIZE = 14
+N_BINS = 40
+CUT_COLORS = ['red', 'orange', 'green', 'purple', 'brown']
+# Threads share the figure style and the imported modules; Agg renders separate figures concurrently
+MAX_WORKERS = 4
+
+
+def response_histograms(inputs, predictions, cuts, n_bins=N_BINS, value_range=(0.0, 1.0)):
+    # Histograms of every variable for all events and for the events above each cut, from one bincount.
+    # Each event is counted once at its level (the number of cuts it passes); the histogram above a cut is the
+    # sum of the levels beyond it. Missing (non-finite) values are left out of their variable's histograms.
+    inputs = np.asarray(inputs, dtype=np.float64)
+    n_events, n_variables = inputs.shape
+    cuts = np.sort(np.asarray(cuts, dtype=np.float64))
+
+    low, high = value_range
+    finite = np.isfinite(inputs)
+    bin_index = np.clip(((np.where(finite, inputs, low) - low) * (n_bins / (high - low))).astype(np.int64), 0,
+                        n_bins - 1)
+    levels = np.searchsorted(cuts, predictions, side='left').astype(np.int64)
+
+    flat_index = (levels[:, None] * n_variables + np.arange(n_variables)) * n_bins + bin_index
+    counts = np.bincount(flat_index[finite], minlength=(len(cuts) + 1) * n_variables * n_bins)
+    counts = counts.reshape(len(cuts) + 1, n_variables, n_bins)
+
+    above = np.cumsum(counts[::-1], axis=0)[::-1]
+    return cuts, above[0], above[1:]
+
+
+def save_response_plot(variable, bin_edges, all_counts, cut_counts, cuts, where_stem, model_name):
+    # Object-oriented Matplotlib: no pyplot state, so figures can be drawn in worker threads
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.set_title(f'Distribution of {variable} for {model_name} Signal Output Events', fontsize=FONT_SIZE)
+    axes.set_xlabel(f'Normalized Value of {variable}', fontsize=FONT_SIZE)
+    axes.set_ylabel('Number of events', fontsize=FONT_SIZE)
+    axes.tick_params(axis='both', labelsize=FONT_SIZE)
+    axes.stairs(all_counts, bin_edges, fill=True, alpha=0.4, color='blue', label='All Signal Events')
+    for position, (cut, counts) in enumerate(zip(cuts, cut_counts)):
+        axes.stairs(counts, bin_edges, hatch='//', color=CUT_COLORS[position % len(CUT_COLORS)],
+                    label=f'High Signal Events (Output > {cut:g})')
+    axes.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+
+    figure.savefig(f'{where_stem[0]}.png', dpi=300)
+    figure.savefig(f'{where_stem[1]}.pdf')
+
+
+def save_response_plots(inputs, predictions, variables, cuts, save_path, model_name='Neural Network', n_workers=None,
+                        n_bins=N_BINS):
+    # inputs are the signal events only; one figure per variable with every cut overlaid
+    cuts, all_counts, cut_counts = response_histograms(inputs, predictions, cuts, n_bins)
+    bin_edges = np.linspace(0.0, 1.0, n_bins + 1)
+
+    with ThreadPoolExecutor(max_workers=min(n_workers or MAX_WORKERS, len(variables) or 1)) as executor:
+        futures = [
+            executor.submit(save_response_plot, variable, bin_edges, all_counts[position], cut_counts[:, position],
+                            cuts, (f'{save_path}/01_png/response_{variable}', f'{save_path}/02_pdf/response_{variable}'),
+                            model_name)
+            for position, variable in enumerate(variables)
+        ]
+        for future in futures:
+            future.result()
@@ -0,0 +1,160 @@
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+FONT_SIZE = 14
+
+
+def load_trials_table(database_path, study_name):
+    # Reads the Optuna SQLite storage directly: one query per table instead of materializing FrozenTrial objects
+    with sqlite3.connect(f'file:{database_path}?mode=ro', uri=True) as connection:
+        study_id = connection.execute('SELECT study_id FROM studies WHERE study_name = ?', (study_name,)).fetchone()
+        if study_id is None:
+            raise KeyError(f'Study {study_name} not found in {database_path}')
+        study_id = study_id[0]
+
+        trials = pd.read_sql_query(
+            'SELECT t.trial_id, t.number, t.state, t.datetime_start, t.datetime_complete, v.value '
+            'FROM trials t LEFT JOIN trial_values v ON v.trial_id = t.trial_id AND v.objective = 0 '
+            'WHERE t.study_id = ?', connection, params=(study_id,))
+        params = pd.read_sql_query(
+            'SELECT p.trial_id, p.param_name, p.param_value, p.distribution_json FROM trial_params p '
+            'JOIN trials t ON t.trial_id = p.trial_id WHERE t.study_id = ?', connection, params=(study_id,))
+        steps = pd.read_sql_query(
+            'SELECT i.trial_id, COUNT(*) AS n_steps, MAX(i.step) AS last_step FROM trial_intermediate_values i '
+            'JOIN trials t ON t.trial_id = i.trial_id WHERE t.study_id = ? GROUP BY i.trial_id',
+            connection, params=(study_id,))
+        user_attributes = pd.read_sql_query(
+            'SELECT a.trial_id, a."key", a.value_json FROM trial_user_attributes a '
+            'JOIN trials t ON t.trial_id = a.trial_id WHERE t.study_id = ?', connection, params=(study_id,))
+
+    trials['datetime_start'] = pd.to_datetime(trials['datetime_start'])
+    trials['datetime_complete'] = pd.to_datetime(trials['datetime_complete'])
+    trials['duration'] = (trials['datetime_complete'] - trials['datetime_start']).dt.total_seconds()
+
+    # Categorical parameters are stored as the index of the choice
+    choices = {}
+    integer_params = []
+    for name, distribution_json in params.drop_duplicates('param_name')[['param_name', 'distribution_json']].values:
+        distribution = json.loads(distribution_json)
+        if distribution['name'] == 'CategoricalDistribution':
+            choices[name] = distribution['attributes']['choices']
+        elif distribution['name'] == 'IntDistribution':
+            integer_params.append(name)
+
+    params_table = params.pivot(index='trial_id', columns='param_name', values='param_value')
+    params_table[integer_params] = params_table[integer_params].round().astype('Int64')
+    for name, name_choices in choices.items():
+        params_table[name] = params_table[name].map(
+            lambda index: name_choices[int(index)] if pd.notna(index) else None).astype(object)
+    params_table.columns = [f'params_{name}' for name in params_table.columns]
+
+    user_attributes['value'] = user_attributes['value_json'].map(json.loads)
+    attributes_table = user_attributes.pivot(index='trial_id', columns='key', values='value')
+    attributes_table.columns = [f'user_attrs_{name}' for name in attributes_table.columns]
+
+    table = (trials.set_index('trial_id')
+             .join(steps.set_index('trial_id'))
+             .join(params_table)
+             .join(attributes_table)
+             .sort_values('number')
+             .reset_index(drop=True))
+    table['state'] = table['state'].astype('category')
+    return table
+
+
+def save_trials_table(table, where_parquet):
+    # Mixed-type columns (categorical choices, list-valued user attributes) are stored as JSON strings
+    table = table.copy()
+    for column in table.columns:
+        if table[column].dtype == object:
+            table[column] = table[column].map(lambda value: None if value is None else json.dumps(value))
+    table.to_parquet(where_parquet, index=False)
+
+
+def param_importances(table, n_quantiles=10):
+    # Share of the variance of the objective explained by each parameter's marginal (correlation ratio eta^2),
+    # with numeric parameters grouped into quantile bins. A cheap stand-in for fANOVA on the summary table.
+    complete = table[(table['state'] == 'COMPLETE') & table['value'].notna()]
+    total_variance = complete['value'].var(ddof=0)
+    importances = {}
+
+    for column in [column for column in complete.columns if column.startswith('params_')]:
+        values = complete[column]
+        if values.dtype != object and values.nunique() > n_quantiles:
+            groups = pd.qcut(values, n_quantiles, duplicates='drop')
+        else:
+            groups = values.astype(str)
+        group_means = complete['value'].groupby(groups, observed=True).agg(['mean', 'size'])
+        between_variance = np.sum(group_means['size'] * (group_means['mean'] - complete['value'].mean()) ** 2)
+        importances[column.removeprefix('params_')] = between_variance / len(complete) / total_variance \
+            if total_variance > 0 else 0.0
+
+    importances = pd.Series(importances, dtype=float)
+    if importances.sum() > 0:
+        importances /= importances.sum()
+    return importances.sort_values(ascending=False)
+
+
+def print_report(table, importances):
+    states = table['state'].value_counts()
+    print(f'Total number of trials: {len(table)}')
+    print(f'Pruned trials: {states.get("PRUNED", 0)}')
+    print(f'Completed trials: {states.get("COMPLETE", 0)}')
+    print(f'Failed trials: {states.get("FAIL", 0)}')
+
+    complete = table[table['state'] == 'COMPLETE']
+    if complete.empty:
+        return
+    best_trial = complete.loc[complete['value'].idxmax()]
+    print('Best Neural Network:')
+    print(f'\tID:  {best_trial["number"]}')
+    print(f'\tAUC: {best_trial["value"]}')
+    print(f'\tDuration: {best_trial["duration"]:.0f} s')
+    print('\tHyperparameters:')
+    for column in table.columns:
+        if column.startswith('params_') and pd.notna(best_trial[column]):
+            print(f'\t\t{column.removeprefix("params_")}: {best_trial[column]}')
+
+    print('Hyperparameter importances:')
+    for name, importance in importances.items():
+        print(f'\t{name}: {importance:.3f}')
+
+
+def save_history_plots(table, importances, save_path):
+    complete = table[table['state'] == 'COMPLETE']
+
+    plt.figure()
+    plt.title('Optimization History', fontsize=FONT_SIZE)
+    plt.xlabel('Trial', fontsize=FONT_SIZE)
+    plt.ylabel('AUC', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.scatter(complete['number'], complete['value'], s=8, color='blue', label='Completed trial')
+    plt.step(complete['number'], complete['value'].cummax(), where='post', color='red', label='Best value')
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+    plt.savefig(f'{save_path}/optimization_history.png', dpi=300)
+    plt.close()
+
+    plt.figure()
+    plt.title('Hyperparameter Importances', fontsize=FONT_SIZE)
+    plt.xlabel('Share of explained variance', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    plt.barh(importances.index[::-1], importances.values[::-1], color='blue')
+    plt.tight_layout()
+    plt.savefig(f'{save_path}/param_importances.png', dpi=300)
+    plt.close()
+
+    plt.figure()
+    plt.title('Trial Duration', fontsize=FONT_SIZE)
+    plt.xlabel('Trial', fontsize=FONT_SIZE)
+    plt.ylabel('Duration, s', fontsize=FONT_SIZE)
+    plt.tick_params(axis='both', labelsize=FONT_SIZE)
+    for state, color in (('COMPLETE', 'blue'), ('PRUNED', 'orange'), ('FAIL', 'red')):
+        trials = table[table['state'] == state]
+        plt.scatter(trials['number'], trials['duration'], s=8, color=color, label=state.capitalize())
+    plt.legend(loc='best', fontsize=FONT_SIZE, fancybox=False, edgecolor='black')
+    plt.savefig(f'{save_path}/trial_durations.png', dpi=300)
+    plt.close()
@@ -0,0 +1,129 @@
+import json
+
+import awkward as ak
+import numpy as np
+import uproot
+
+from config import Config
+
+# Share of each sample in the full MiniNtuple set (tHbq 300K, tt 3M, ttbb 300K, ttH 100K, tZbq 100K)
+PROCESS_FRACTIONS = {
+    'tHbq': 0.3 / 3.8,
+    'tt': 3.0 / 3.8,
+    'ttbb': 0.3 / 3.8,
+    'ttH': 0.1 / 3.8,
+    'tZbq': 0.1 / 3.8
+}
+
+# (kind, location, scale) of each branch; kinds: 'charge' is +-1, 'positive' is gamma distributed with the given
+# mean and standard deviation, 'symmetric' is normal
+VARIABLE_SHAPES = {
+    'lead_lep_charge': ('charge', 0.0, 1.0),
+    'HT_alljets': ('positive', 450.0, 180.0),
+    'delta_eta_tH': ('symmetric', 0.0, 1.5),
+    'sphresity_alljets': ('positive', 0.25, 0.15),
+    'sphresity_lnu4maxjet': ('positive', 0.3, 0.15),
+    'higgs_m': ('positive', 120.0, 35.0),
+    'mass_tH': ('positive', 450.0, 150.0),
+    'delta_eta_FWD_t': ('symmetric', 0.0, 2.0),
+    'min_chi': ('positive', 5.0, 4.0),
+    'mass_H_CenJet': ('positive', 250.0, 90.0),
+    'mass_H_FWD': ('positive', 400.0, 180.0),
+    'FWD_pt': ('positive', 60.0, 35.0),
+    'fwm1': ('positive', 0.2, 0.1),
+    'top_m': ('positive', 170.0, 40.0),
+    'DeltaR_qqW': ('positive', 2.0, 0.8),
+    'RapGap_maxptb': ('positive', 1.8, 1.1),
+    'RapGap_closestb': ('positive', 1.2, 0.9),
+    'Central_non_b_maxpt_pt': ('positive', 70.0, 40.0),
+    'FWD_m': ('positive', 350.0, 160.0),
+    'jet_b2_e': ('positive', 120.0, 70.0),
+    'W_T_m': ('positive', 60.0, 35.0),
+    'InvMass_3Jets': ('positive', 300.0, 120.0)
+}
+
+SAMPLES = Config.SAMPLES
+
+# Object-level branches are stored as jagged arrays with one entry, and no entry when the object is missing
+JAGGED_VARIABLES = ['higgs_m', 'top_m', 'FWD_pt', 'FWD_m', 'Central_non_b_maxpt_pt', 'jet_b2_e']
+
+# Energy-like branches share a per-event scale factor, which correlates them as in the real samples
+ENERGY_VARIABLES = ['HT_alljets', 'mass_tH', 'mass_H_CenJet', 'mass_H_FWD', 'FWD_pt', 'Central_non_b_maxpt_pt',
+                    'FWD_m', 'jet_b2_e', 'InvMass_3Jets']
+
+# Signal-like shift of the location, in units of the scale, so that the samples are separable
+PROCESS_SHIFTS = {
+    'tHbq': 0.5,
+    'tt': 0.0,
+    'ttbb': 0.15,
+    'ttH': 0.3,
+    'tZbq': 0.35
+}
+
+
+def process_sizes(n_events):
+    sizes = {process: int(round(n_events * fraction)) for process, fraction in PROCESS_FRACTIONS.items()}
+    sizes['tt'] += n_events - sum(sizes.values())
+    return sizes
+
+
+def generate_variable(rng, name, n_events, shift):
+    kind, location, scale = VARIABLE_SHAPES[name]
+    if kind == 'charge':
+        return rng.choice(np.array([-1.0, 1.0]), size=n_events)
+    if kind == 'symmetric':
+        return rng.normal(location, scale * (1.0 - 0.3 * shift), size=n_events)
+
+    mean = location + shift * scale
+    shape = (mean / scale) ** 2
+    return rng.gamma(shape, mean / shape, size=n_events)
+
+
+def generate_events(process, n_events, seed=0, chunk=0):
+    # Columns named like the Config.VARIABLES_DESCRIPTION branches, float64 as read back from the MiniNtuples
+    rng = np.random.default_rng([seed, list(PROCESS_SHIFTS).index(process), chunk])
+    shift = PROCESS_SHIFTS[process]
+    events = {name: generate_variable(rng, name, n_events, shift) for name in Config.VARIABLES_DESCRIPTION}
+
+    event_scale = rng.lognormal(0.0, 0.15, size=n_events)
+    for name in ENERGY_VARIABLES:
+        events[name] *= event_scale
+    return events
+
+
+def empty_event_mask(process, n_events, empty_fraction, seed=0, chunk=0):
+    rng = np.random.default_rng([seed, list(PROCESS_SHIFTS).index(process), chunk, 1])
+    return rng.random(n_events) < empty_fraction
+
+
+def to_jagged(events, empty_events):
+    # Events flagged as empty have no entry in the object-level branches
+    counts = (~empty_events).astype(np.int64)
+    jagged = dict(events)
+    for name in JAGGED_VARIABLES:
+        jagged[name] = ak.unflatten(events[name][~empty_events], counts)
+    return jagged
+
+
+def write_json(where_json, events, empty_events=None):
+    # Same layout as root2json: one list of values per branch, None where a jagged branch has no entry
+    with open(where_json, 'w', encoding='utf-8') as json_file:
+        json.dump({
+            name: (np.where(empty_events, None, values).tolist()
+                   if empty_events is not None and name in JAGGED_VARIABLES else values.tolist())
+            for name, values in events.items()
+        }, json_file)
+
+
+def write_sample(where_root, process, n_events, seed=0, chunk_size=1_000_000, empty_fraction=0.02):
+    # Chunked writing keeps memory flat, so 10M+ event trees can be produced; one TBasket set per chunk
+    _, tree_name = SAMPLES[process]
+    branch_types = {name: 'var * float64' if name in JAGGED_VARIABLES else 'float64'
+                    for name in Config.VARIABLES_DESCRIPTION}
+
+    with uproot.recreate(where_root) as root_file:
+        tree = root_file.mktree(tree_name, branch_types)
+        for chunk, start in enumerate(range(0, n_events, chunk_size)):
+            size = min(chunk_size, n_events - start)
+            events = generate_events(process, size, seed, chunk)
+            tree.extend(to_jagged(events, empty_event_mask(process, size, empty_fraction, seed, chunk)))